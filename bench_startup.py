@@ -0,0 +1,66 @@
+"""
+Benchmarks the time from launching query.py to its first printed result, with
+the normalization settings baked into the index by the indexer versus the older
+path that imports nltk's stop words and stemmer on startup.  The corpus defaults
+to SmallWiki.xml, since on a tiny wiki the nltk import is nearly all of the
+startup time and the ratio overstates the gain.
+
+bench_startup.py [<wiki-pages>.xml] [runs] [search terms]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import statistics
+import subprocess
+from index import Indexer
+from file_io import companion_file
+
+def time_to_first_result(files: list, search: str, runs: int) -> float:
+    """
+    Launches query.py as a fresh process the given number of times, each time
+    sending a single search followed by :quit, and returns the median seconds
+    until the process has printed its results and exited.
+
+    Parameters:
+    files -- list of the title, docs, and words filepath strings
+    search -- search terms to send to the querier
+    runs -- number of times to launch the querier
+
+    Returns:
+    the median wall-clock time in seconds
+    """
+    query_py = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        "query.py")
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, query_py] + files,
+            input=search + "\n:quit\n", capture_output=True, text=True,
+            check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+if __name__ == "__main__":
+    xml_file = sys.argv[1] if len(sys.argv) > 1 else "SmallWiki.xml"
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    search = sys.argv[3] if len(sys.argv) > 3 else "orange juice"
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        files = [os.path.join(tmp_dir, name)
+            for name in ["title_file.txt", "docs_file.txt", "words_file.txt"]]
+        Indexer([xml_file] + files)
+
+        baked = time_to_first_result(files, search, runs)
+        for tag in ["meta", "stems"]:  # hide the baked settings from query.py
+            os.remove(companion_file(files[2], tag))
+        legacy = time_to_first_result(files, search, runs)
+
+        print("median time to first result over " + str(runs) + " runs")
+        print("  baked normalization:  %.3f s" % baked)
+        print("  nltk on startup:      %.3f s" % legacy)
+        print("  speedup:              %.1fx" % (legacy / baked))
+    finally:
+        shutil.rmtree(tmp_dir)
@@ -0,0 +1,176 @@
+import sys
+import heapq
+import multiprocessing
+from ctypes import ArgumentError
+from query import Query
+from file_io import companion_file, read_meta_file
+
+def serve_shard(args: list, conn):
+    """Runs inside a shard worker process.  Loads a Query over a single shard's
+    index files and answers (words, k) requests from the coordinator with that
+    shard's partial top-k list until it is sent None.  Any exception raised
+    while loading or answering is sent back in place of a reply, so that the
+    coordinator re-raises it rather than waiting forever on a dead worker.
+
+    Parameters:
+    args -- command line style arguments for the shard's Query
+    conn -- worker end of the Pipe connecting it to the coordinator
+    """
+    try:
+        querier = Query(args)
+    except Exception as err:
+        conn.send(err)
+        return
+    conn.send(True)  # signals that the shard is loaded and ready
+
+    try:
+        for words, k in iter(conn.recv, None):
+            try:
+                reply = [(score, pid, querier.ids_to_titles[pid])
+                    for pid, score in querier.top_scores(words, k)]
+            except Exception as err:
+                reply = err
+            conn.send(reply)
+    except EOFError:  # the coordinator has gone away
+        pass
+    conn.close()
+
+class Coordinator(Query):
+    """
+    Class that answers search queries over an index that was split into shards
+    by the indexer's --shards option.  Each shard is held by its own worker
+    process, so no single process has to load the whole index.  Queries are
+    fanned out to every shard and their partial top-k lists are merged into the
+    exact global top-k, which works because every page lives in exactly one
+    shard and relevance scores were computed with corpus-wide idf values.
+    """
+    def __init__(self, args):
+        self.pagerank = False
+        self.t_file, self.d_file, self.w_file = self.process_arguments(args)
+        self.stop_words = None  # normalization settings are loaded lazily
+        self.doc_store = None  # and so is the document store
+        self.ids_to_titles = {}  # titles of the results shards have returned
+
+        shard_info = {}
+        read_meta_file(companion_file(self.t_file, "shards"), shard_info)
+
+        self.workers = []
+        self.conns = []
+        for shard in range(int(shard_info["shards"])):
+            shard_args = self.option_args() + [companion_file(f, str(shard))
+                for f in (self.t_file, self.d_file, self.w_file)]
+            conn, worker_conn = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=serve_shard,
+                args=(shard_args, worker_conn), daemon=True)
+            worker.start()
+            worker_conn.close()  # so recv sees EOF if the worker exits
+            self.workers.append(worker)
+            self.conns.append(conn)
+
+        try:  # wait for every shard to finish loading
+            self.receive_all()
+        except Exception:
+            self.close()
+            raise
+
+    def receive_all(self) -> list:
+        """Receives one reply from every shard worker.  Every reply is read
+        before any error is raised, so that the pipes stay in step with the
+        requests that were sent.
+
+        Returns:
+        A list of the shards' replies, in shard order
+
+        Throws:
+        The first exception a shard sent back, or RuntimeError if a shard 
+        worker exited without replying
+        """
+        replies = []
+        for shard, conn in enumerate(self.conns):
+            try:
+                replies.append(conn.recv())
+            except EOFError:
+                replies.append(RuntimeError("shard " + str(shard) 
+                    + " worker exited unexpectedly"))
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+        return replies
+
+    def gather(self, words: list, k=10) -> list:
+        """Sends processed search words to every shard and merges the partial
+        results the shards send back, recording the titles of the merged 
+        results so that Query's retrieve_results and print_results work as-is.
+
+        Parameters:
+        words -- list of proccessed words from search query
+        k -- maximum number of documents to return
+
+        Returns:
+        A list of (score, page ID, title) tuples in descending order by score
+        """
+        for conn in self.conns:
+            try:
+                conn.send((words, k))
+            except (BrokenPipeError, OSError):  # receive_all reports the shard
+                pass
+        partial_results = self.receive_all()
+        results = heapq.nlargest(k, (result for partial in partial_results
+            for result in partial), key=lambda x: x[0])
+        for _, pid, title in results:
+            self.ids_to_titles[pid] = title
+        return results
+
+    def top_scores(self, words: list, k=10) -> list:
+        """Returns the IDs and scores of the top, maximum of k, documents
+        across all shards.
+
+        Parameters:
+        words -- list of proccessed words from search query
+        k -- maximum number of documents to return
+
+        Returns:
+        A list of (page ID, score) tuples in descending order by score
+        """
+        return [(pid, score) for score, pid, _ in self.gather(words, k)]
+
+    def close(self):
+        """Tells every shard worker to exit and waits for them to finish."""
+        for conn in self.conns:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):  # worker has already exited
+                pass
+            conn.close()
+        for worker in self.workers:
+            worker.join()
+        self.conns = []
+        self.workers = []
+
+if __name__ == "__main__":
+    """
+    Sets up the same REPL interface as query.py, but over a sharded index.
+    """
+    try:
+        q = Coordinator(sys.argv[1:])
+        try:
+            while True is True:  # continue until break statement is reached
+                try:
+                    response = input("Search for pages here: ")
+                except EOFError:  # end of input, e.g. ctrl-D
+                    break
+                if response == ':quit':
+                    break
+                q.print_results(response)
+        finally:
+            q.close()
+    except FileNotFoundError:
+        print("File not found -- try again.")
+    except RuntimeError as err:
+        print("A shard stopped responding (" + str(err) + ") -- try again.")
+    except ArgumentError:
+        print("Invalid command line arguments, try again.  Arguments must take"
+        + " the form: \n    --pagerank <title-file>.txt <docs-file>.txt"
+        + " <words-file>.txt \nwhere --pagerank is an optional argument (as"
+        + " are --title-boost=<b> and --title-only) and the files were written"
+        + " by index.py with --shards=<n>.")
@@ -0,0 +1,107 @@
+"""
+Provides streaming access to XML corpora that may be compressed, decompressing
+.xml.bz2 and .xml.gz dumps in a background thread so that decompression overlaps
+with XML parsing and tokenizing instead of requiring the dump to be unpacked on
+disk first
+"""
+import io
+import bz2
+import gzip
+import queue
+import threading
+
+CORPUS_EXTENSIONS = (".xml", ".xml.bz2", ".xml.gz")
+
+
+class PipelinedReader(io.RawIOBase):
+    """
+    A read-only stream whose bytes are produced by a background thread that
+    reads (and thereby decompresses) another stream in chunks.  At most
+    max_chunks decompressed chunks are buffered at once, so the decompressor
+    can run ahead of the reader without holding the whole corpus in memory.
+    bz2 and zlib release the GIL while decompressing, so the two threads run
+    concurrently.
+    """
+    def __init__(self, source, chunk_size=1 << 20, max_chunks=8):
+        self.chunks = queue.Queue(max_chunks)
+        self.pending = memoryview(b"")  # remainder of the current chunk
+        self.eof = False
+        self.stopping = False
+        self.thread = threading.Thread(target=self.decompress,
+            args=(source, chunk_size), daemon=True)
+        self.thread.start()
+
+    def decompress(self, source, chunk_size: int):
+        """
+        Runs in the background thread, reading chunks from the source stream
+        into the queue until the source is exhausted or the reader is closed.
+        An exception raised while reading is passed on to the reader.
+
+        Parameters:
+        source -- readable (decompressing) binary stream
+        chunk_size -- number of bytes to read from the source at a time
+        """
+        try:
+            while not self.stopping:
+                chunk = source.read(chunk_size)
+                self.chunks.put(chunk)
+                if not chunk:  # an empty chunk marks the end of the stream
+                    break
+        except Exception as err:
+            self.chunks.put(err)
+        finally:
+            source.close()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        """
+        Copies the next decompressed bytes into buffer, waiting for the
+        background thread if no decompressed bytes are available yet.
+
+        Parameters:
+        buffer -- writable buffer to fill
+
+        Returns:
+        the number of bytes copied, which is 0 only at the end of the stream
+        """
+        if not self.pending:
+            if self.eof:
+                return 0
+            chunk = self.chunks.get()
+            if isinstance(chunk, Exception):
+                self.eof = True
+                raise chunk
+            if not chunk:
+                self.eof = True
+                return 0
+            self.pending = memoryview(chunk)
+        num_bytes = min(len(buffer), len(self.pending))
+        buffer[:num_bytes] = self.pending[:num_bytes]
+        self.pending = self.pending[num_bytes:]
+        return num_bytes
+
+    def close(self):
+        """Stops the background thread, unblocking it if the queue is full."""
+        self.stopping = True
+        while self.thread.is_alive():
+            try:
+                self.chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        super().close()
+
+
+def open_corpus(path: str):
+    """
+    Opens an XML corpus for binary reading, decompressing it in a background
+    thread if it's a .xml.bz2 or .xml.gz dump
+    :param path: filepath of the corpus, ending in one of CORPUS_EXTENSIONS
+    :return: a readable binary stream of the XML, to be used as a context manager
+    """
+    if path.endswith(".xml.bz2"):
+        return io.BufferedReader(PipelinedReader(bz2.open(path, "rb")))
+    elif path.endswith(".xml.gz"):
+        return io.BufferedReader(PipelinedReader(gzip.open(path, "rb")))
+    return open(path, "rb")
@@ -0,0 +1,135 @@
+"""
+Provides a document store that keeps the text of every page in zlib-compressed
+blocks, so that the querier can show snippets for its top results by randomly
+accessing (and decompressing) only the blocks that hold those pages
+"""
+import os
+import zlib
+import functools
+
+BLOCK_SIZE = 64 * 1024  # bytes of page text compressed together in one block
+
+
+class DocStoreWriter:
+    """
+    Objects of this class append page texts to a store file in compressed
+    blocks of about block_size bytes each, and write an offset table that
+    records where every block starts in the store file and where each page's
+    text lies within its block.  Pages are numbered by ordinal, i.e. the order
+    in which they were added.  Both files are written under temporary names
+    and only replace any existing store when the writer is closed, so that a
+    store abandoned part way through leaves the previous one intact.
+    output table looks like:
+    b offset1 length1
+    b offset2 length2
+    id1 block1 start1 length1
+    id2 block2 start2 length2
+    """
+    def __init__(self, store: str, table: str, block_size=BLOCK_SIZE):
+        self.store = store
+        self.table = table
+        self.store_fh = open(store + ".tmp", "wb")
+        self.block_size = block_size
+        self.block = bytearray()  # uncompressed text of the current block
+        self.blocks = []  # (offset, compressed length) of each written block
+        self.pages = []  # (page id, block, start, length) of each page
+        self.offset = 0
+
+    def add(self, pid: int, text: str):
+        """
+        Adds a page's text to the current block, compressing and writing the
+        block once it holds at least block_size bytes
+        :param pid: integer page id
+        :param text: text of the page
+        :return: n/a
+        """
+        encoded = text.encode("utf-8")
+        self.pages.append((pid, len(self.blocks), len(self.block),
+            len(encoded)))
+        self.block.extend(encoded)
+        if len(self.block) >= self.block_size:
+            self.flush_block()
+
+    def flush_block(self):
+        """
+        Compresses the current block and appends it to the store file
+        :return: n/a
+        """
+        compressed = zlib.compress(bytes(self.block))
+        self.store_fh.write(compressed)
+        self.blocks.append((self.offset, len(compressed)))
+        self.offset += len(compressed)
+        self.block = bytearray()
+
+    def close(self):
+        """
+        Writes the final partial block and the offset table, then moves both
+        files into place
+        :return: n/a
+        """
+        if self.block:
+            self.flush_block()
+        self.store_fh.close()
+        with open(self.table + ".tmp", "w") as table_fh:
+            for offset, length in self.blocks:
+                table_fh.write("b " + str(offset) + " " + str(length) + "\n")
+            for page in self.pages:
+                table_fh.write(" ".join([str(n) for n in page]) + "\n")
+        os.replace(self.store + ".tmp", self.store)
+        os.replace(self.table + ".tmp", self.table)
+
+    def abort(self):
+        """
+        Discards everything written so far, leaving any existing store as it was
+        :return: n/a
+        """
+        self.store_fh.close()
+        for path in [self.store + ".tmp", self.table + ".tmp"]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class DocStore:
+    """
+    Objects of this class read page texts back out of a store written by
+    DocStoreWriter.  Only the offset table is loaded up front; blocks are read
+    and decompressed on demand and the most recently used cache_blocks of them
+    are kept decompressed in an LRU cache.
+    """
+    def __init__(self, store: str, table: str, cache_blocks=32):
+        self.store = store
+        self.blocks = []  # (offset, compressed length) by block number
+        self.ids_to_ordinals = {}
+        self.pages = []  # (block, start, length) by page ordinal
+        with open(table, "r") as table_fh:
+            for line in table_fh:
+                split = line.split()
+                if split[0] == "b":
+                    self.blocks.append((int(split[1]), int(split[2])))
+                else:
+                    self.ids_to_ordinals[int(split[0])] = len(self.pages)
+                    self.pages.append(tuple(int(n) for n in split[1:]))
+        self.read_block = functools.lru_cache(maxsize=cache_blocks)(
+            self.read_block)
+
+    def read_block(self, block: int) -> bytes:
+        """
+        Reads and decompresses a single block of the store file
+        :param block: the block number
+        :return: the uncompressed bytes of the block
+        """
+        offset, length = self.blocks[block]
+        with open(self.store, "rb") as store_fh:
+            store_fh.seek(offset)
+            return zlib.decompress(store_fh.read(length))
+
+    def text(self, pid: int) -> str:
+        """
+        Looks up the text of a page, decompressing its block if it isn't cached
+        :param pid: integer page id
+        :return: the text of the page, or None if the page isn't in the store
+        """
+        if pid not in self.ids_to_ordinals:
+            return None
+        block, start, length = self.pages[self.ids_to_ordinals[pid]]
+        return self.read_block(block)[start:start + length].decode("utf-8")
@@ -1,8 +1,39 @@
 """
 Provides functionality for reading from/writing to the 3 index files used by
-indexer and querier in search
+indexer and querier in search, along with the companion files written next to them
 """
 
+import hashlib
+
+WRITE_BUFFER = 1 << 20  # bytes buffered before each write to a words file
+
+def companion_file(path: str, tag: str, ext=".txt") -> str:
+    """
+    Derives the name of a file that accompanies one of the 3 index files, so that
+    e.g. the tag "0" turns words_file.txt into words_file_0.txt
+    :param path: filepath of the index file ending in .txt
+    :param tag: string distinguishing the companion file
+    :param ext: extension of the companion file
+    :return: the filepath of the companion file
+    """
+    return path[:-4] + "_" + tag + ext
+
+
+def write_meta_file(meta: str, dictionary: dict):
+    """
+    Writes a dictionary of settings into a file to be read in querying
+    output looks like:
+    key1::value1
+    key2::value2
+    :param meta: the file that settings will get written to
+    :param dictionary: a hashmap that maps setting names to values
+    :return: n/a
+    """
+    with open(meta, "w") as meta_fh:
+        for key, value in dictionary.items():
+            meta_fh.write(key + "::" + str(value) + "\n")
+
+
 def write_title_file(title: str, dictionary: dict):
     """
     Writes the dictionary of documents to titles into a file to be read in querying
@@ -18,20 +49,27 @@ def write_title_file(title: str, dictionary: dict):
             title_fh.write(str(id_num) + "::" + title + "\n")
 
 
-def write_docs_file(docs: str, ids_to_pageranks: dict):
+def write_docs_file(docs: str, ids_to_pageranks: dict, ids_to_ordinals=None):
     """
     Writes the dictionary of ids the value of
-    that page's rank from the Pagerank algorithm to be read in querying
+    that page's rank from the Pagerank algorithm to be read in querying, 
+    followed by the ordinal that stands for the page in the words file if the
+    index was reordered
     output looks like:
-    id1 pagerank1
-    id2 pagerank2
+    id1 pagerank1 [ordinal1]
+    id2 pagerank2 [ordinal2]
     :param docs: filepath to docs file 
     :param ids_to_pageranks: dictionary of ids --> pageranks
+    :param ids_to_ordinals: dictionary of ids --> ordinals, or None
     :return: n/a
     """
     with open(docs, "w") as docs_fh:
         for id_num, rank in ids_to_pageranks.items():
-            docs_fh.write(str(id_num) + " " + str(rank) + "\n")
+            if ids_to_ordinals is None:
+                docs_fh.write(str(id_num) + " " + str(rank) + "\n")
+            else:
+                docs_fh.write(str(id_num) + " " + str(rank) + " " + 
+                    str(ids_to_ordinals[id_num]) + "\n")
 
 
 def write_words_file(words: str, words_to_doc_relevance: dict):
@@ -44,12 +82,68 @@ def write_words_file(words: str, words_to_doc_relevance: dict):
     :param words_to_doc_relevance: the dictionary that provides words -> ids -> term relevance
     :return: n/a
     """
-    with open(words, "w") as words_fh:
+    with open_words_file(words) as words_fh:
         for word, ids_to_relevance in words_to_doc_relevance.items():
-            words_fh.write(word + " ")
-            for id_num, relevance in ids_to_relevance.items():
-                words_fh.write(str(id_num) + " " + str(relevance) + " ")
-            words_fh.write("\n")
+            write_words_line(words_fh, word, ids_to_relevance)
+
+
+def open_words_file(words: str):
+    """
+    Opens a words file for writing with a large buffer, since it's written as
+    many lines of postings one after another
+    :param words: the file that will get written to
+    :return: the open file handle
+    """
+    return open(words, "w", buffering=WRITE_BUFFER)
+
+
+def write_words_line(words_fh, word: str, ids_to_relevance: dict):
+    """
+    Writes a single word's line of the words file to an already open file, so
+    that the words file can be written one word at a time.  The line is built
+    as one string and written with a single call
+    :param words_fh: the open file handle of the words file
+    :param word: the word at the start of the line
+    :param ids_to_relevance: the dictionary that provides ids -> term relevance
+    :return: n/a
+    """
+    words_fh.write(word + " " + "".join([str(id_num) + " " + str(relevance) 
+        + " " for id_num, relevance in ids_to_relevance.items()]) + "\n")
+
+
+def write_stems_file(stems: str, words_to_stems: dict):
+    """
+    Writes the dictionary of lower-cased words to their stems
+    output looks like:
+    word1 stem1
+    word2 stem2
+    :param stems: the file that will get written to
+    :param words_to_stems: the dictionary that provides words -> stems, or an
+    iterable of (word, stem) pairs
+    :return: n/a
+    """
+    if isinstance(words_to_stems, dict):
+        words_to_stems = words_to_stems.items()
+    with open(stems, "w") as stems_fh:
+        for word, stem in words_to_stems:
+            stems_fh.write(word + " " + stem + "\n")
+
+
+def write_links_file(links: str, ids_to_links: dict):
+    """
+    Writes the link graph of the corpus, each page followed by the ids of the
+    in-corpus pages it links to (if any)
+    output looks like:
+    id1 link1_1 link1_2 ...
+    id2
+    :param links: the file that will get written to
+    :param ids_to_links: the dictionary that provides ids -> sets of linked ids
+    :return: n/a
+    """
+    with open(links, "w") as links_fh:
+        for id_num, linked_ids in ids_to_links.items():
+            links_fh.write(" ".join([str(id_num)] + 
+                [str(link) for link in linked_ids]) + "\n")
 
 
 def read_title_file(titles: str, ids_to_titles: dict):
@@ -68,11 +162,13 @@ def read_title_file(titles: str, ids_to_titles: dict):
             ids_to_titles[int(split[0])] = split[1]
 
 
-def read_docs_file(docs: str, ids_to_pageranks: dict):
+def read_docs_file(docs: str, ids_to_pageranks: dict, ordinals_to_ids=None):
     """
-    reads in the pageranks written in docs to into ids_to_pageranks dictionary
+    reads in the pageranks written in docs to into ids_to_pageranks dictionary,
+    and the ordinals of a reordered index into ordinals_to_ids if it's given
     :param docs: filepath to docs file 
     :param ids_to_pageranks: dictionary of ids to pageranks 
+    :param ordinals_to_ids: dictionary of ordinals to ids, or None
     :return: n/a
     """
     with open(docs, "r") as docs_fh:
@@ -83,6 +179,8 @@ def read_docs_file(docs: str, ids_to_pageranks: dict):
             split = line.split(" ")
             if len(split) > 1:
                 ids_to_pageranks[int(split[0])] = float(split[1])
+            if len(split) > 2 and ordinals_to_ids is not None:
+                ordinals_to_ids[int(split[2])] = int(split[0])
 
 
 def read_words_file(words: str, words_to_doc_relevance: dict):
@@ -93,16 +191,80 @@ def read_words_file(words: str, words_to_doc_relevance: dict):
     in which an id is a key to a frequency
     :return: n/a
     """
+    for word, ids_to_relevance in iter_words_file(words):
+        if word not in words_to_doc_relevance:
+            words_to_doc_relevance[word] = {}
+        words_to_doc_relevance[word].update(ids_to_relevance)
+
+
+def iter_words_file(words: str):
+    """
+    generator that reads the words file one line at a time
+    :param words: the file name that the words_to_doc_frequency dictionary was written to
+    :return: yields (word, dictionary of ids -> term relevance) in file order,
+    skipping words without any ids
+    """
     with open(words, "r") as words_fh:
         for line in words_fh:
-            line = line.strip()
+            split = line.split()
+            if len(split) < 3:
+                continue
+            yield split[0], {int(split[i]): float(split[i+1]) 
+                for i in range(1, len(split), 2)}
+
+
+def pagerank_digest(ids_to_pageranks: dict) -> str:
+    """
+    Fingerprints a set of PageRank scores as they're written to a docs file, so
+    that files derived from them can be checked against the docs file later
+    :param ids_to_pageranks: dictionary of ids --> pageranks
+    :return: a hex digest string
+    """
+    digest = hashlib.sha1()
+    for id_num, rank in sorted(ids_to_pageranks.items()):
+        digest.update((str(id_num) + " " + str(rank) + "\n").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def read_links_file(links: str, ids_to_links: dict):
+    """
+    reads in the link graph written in links into the ids_to_links dictionary
+    :param links: the file name that the link graph was written to
+    :param ids_to_links: the dictionary that ids and sets of linked ids will get written into
+    :return: n/a
+    """
+    with open(links, "r") as links_fh:
+        for line in links_fh:
+            split = line.split()
+            if split:
+                ids_to_links[int(split[0])] = set(int(l) for l in split[1:])
+
+
+def read_stems_file(stems: str, words_to_stems: dict):
+    """
+    reads in the stems written in stems into the words_to_stems dictionary
+    :param stems: the file name that the words_to_stems dictionary was written to
+    :param words_to_stems: the dictionary that words and stems will get written into
+    :return: n/a
+    """
+    with open(stems, "r") as stems_fh:
+        for line in stems_fh:
+            split = line.split()
+            if len(split) == 2:
+                words_to_stems[split[0]] = split[1]
+
+
+def read_meta_file(meta: str, dictionary: dict):
+    """
+    reads the settings written in meta into the dictionary, leaving values as strings
+    :param meta: the file name that contains settings
+    :param dictionary: the dictionary that setting names and values will get written into
+    :return: n/a
+    """
+    with open(meta, "r") as meta_fh:
+        for line in meta_fh:
+            line = line.rstrip("\n")
             if line == "":
                 continue
-            split = line.split(" ")
-            word = split[0]
-            for i in range(1, len(split), 2):
-                page_id = int(split[i])
-                relevance = float(split[i+1])
-                if word not in words_to_doc_relevance:
-                    words_to_doc_relevance[word] = {}
-                words_to_doc_relevance[word][page_id] = relevance
\ No newline at end of file
+            key, value = line.split("::", 1)
+            dictionary[key] = value
@@ -2,11 +2,18 @@
 from ctypes import ArgumentError
 import sys
 import re
+import os
 import math
+import shutil
+from collections import deque
+import tempfile
 import xml.etree.ElementTree as et
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
 import file_io
+import spimi
+import minhash
+import decompress
+from docstore import DocStoreWriter
+from options import split_options
 
 class WordInfo:
     """
@@ -35,10 +42,52 @@ class Indexer:
     calculates term relevance and PageRank scores, and stores that information 
     in text files to enable rapid searching with or without PageRank applied.
     """
+    # names of the --reorder page orderings, and the methods that produce them
+    ORDERINGS = {"pagerank": "pagerank_order", "links": "link_order"}
+
     def __init__(self, args: list):
+        options, args = split_options(args, {"shards": int, "partition": str,
+            "damping": float, "tolerance": float, "memory-budget": float,
+            "pagerank-postings": bool, "pagerank-weight": float, 
+            "reorder": str, "dedup": float})
+        self.num_shards = options.get("shards", 1)  # number of index partitions
+        self.partition = options.get("partition", "range")  # or "hash"
+        if self.num_shards < 1 or self.partition not in ("range", "hash"):
+            raise ArgumentError
+        # megabytes of postings to hold in memory before spilling them to disk
+        self.memory_budget = options.get("memory-budget")
+        if self.memory_budget is not None and self.memory_budget <= 0:
+            raise ArgumentError
+        self.num_runs = 0  # number of postings runs spilled to disk
+        self.stem_runs = []  # runs of memoized stems spilled to disk with them
+        self.doc_store = None  # DocStoreWriter, while the corpus is indexed
+        # exponent of PageRank in the optional relevance * PageRank postings
+        self.pagerank_weight = None
+        if "pagerank-postings" in options or "pagerank-weight" in options:
+            self.pagerank_weight = options.get("pagerank-weight", 1.0)
+        # page ordering used to renumber pages with dense ordinals, if any
+        self.reorder = options.get("reorder")
+        if self.reorder is not None and self.reorder not in self.ORDERINGS:
+            raise ArgumentError
+        self.ids_to_ordinals = None
+        # minimum similarity of near-duplicate pages to collapse, if any
+        self.dedup = options.get("dedup")
+        if self.dedup is not None and not 0 < self.dedup <= 1:
+            raise ArgumentError
+        self.signatures = {}  # page IDs to MinHash signatures, with --dedup
+        self.page_postings = {}  # page IDs to numbers of distinct terms, too
+        self.page_terms = None  # terms of the page being processed, if needed
+        self.duplicates = {}  # IDs of collapsed pages to their canonical pages
+        # the title field is also counted on its own, in WordInfos keyed on
+        # words, along with the number of terms in each page's title
+        self.title_info = {}
+        self.title_lengths = {}
+        self.num_title_postings = 0  # (page, word) pairs in title_info
+        self.title_runs = []  # runs of title counts spilled with the others
+        self.set_rank_options(options)
         if len(args) != 4:
             raise ArgumentError
-        if len(args[0]) < 4 or args[0][-4:] != '.xml':
+        if not args[0].endswith(decompress.CORPUS_EXTENSIONS):
             raise ArgumentError
         for arg in args[1:]:
             if len(arg) < 4 or arg[-4:] != '.txt':
@@ -48,9 +97,32 @@ class Indexer:
         self.num_pages = 0  # keep track of number of pages in corpus
         self.n_regex = \
             '''\[\[[^\[]+?\]\]|[a-zA-Z0-9]+'[a-zA-Z0-9]+|[a-zA-Z0-9]+'''
+        # nltk is slow to import, so scripts like rank.py that reuse Indexer 
+        # methods without tokenizing anything never import it
+        from nltk.corpus import stopwords
+        from nltk.stem import PorterStemmer
+        self.stop_words = set(stopwords.words('english'))
+        self.stemmer = PorterStemmer()
+        self.stems = {}  # lower-cased words to stems, for non-stop words seen
 
         self.write_index_files(args[0], args[1], args[2], args[3])
 
+    def set_rank_options(self, options: dict):
+        """
+        Sets the PageRank damping factor (the probability of jumping to a 
+        random page) and the convergence tolerance from parsed options.
+
+        Parameters:
+        options -- dict of option names to values from the command line
+
+        Throws:
+        ArgumentError if the damping factor or tolerance is out of range
+        """
+        self.damping = options.get("damping", 0.15)
+        self.tolerance = options.get("tolerance", 0.001)
+        if not 0 <= self.damping <= 1 or self.tolerance <= 0:
+            raise ArgumentError
+
     def write_index_files(self, xml_file: str, title_file: str, docs_file: str, 
     words_file: str):
         """
@@ -59,21 +131,322 @@ class Indexer:
         text file using methods from file_io.
 
         Parameters:
-        xml_file -- filepath string of an XML-format corpus of wiki pages
+        xml_file -- filepath string of an XML-format corpus of wiki pages, 
+        which may be compressed as .xml.bz2 or .xml.gz
         title_file -- filepath string for storing page IDs and titles
         docs_file -- filepath string for storing page IDs and PageRank scores
         words_file -- filepath string for storing words & term relevance scores
         """
-        # populates ids_to_titles and counts/records pages in the corpus
-        pages, ids_to_titles = self.get_pages(xml_file)
-        # populates words_to_relevance & records info about links in page_info
-        words_to_relevance, page_info = self.calc_relevance(pages)
-        # populates ids_to_pageranks using the now-populated page_info
-        ids_to_pageranks = self.calc_ranks(page_info)
+        run_dir = None
+        # process_page adds each page's text to the document store
+        self.doc_store = DocStoreWriter(
+            file_io.companion_file(title_file, "store", ".bin"),
+            file_io.companion_file(title_file, "store"))
+        try:
+            if self.memory_budget is None:
+                # populates ids_to_titles and counts/records pages in the corpus
+                pages, ids_to_titles = self.get_pages(xml_file)
+                # counts words & records link info in page_info, then streams
+                # each word's relevances to write_postings as it's computed
+                word_info, page_info = self.process_pages(pages)
+                del pages  # the parsed XML isn't needed once it's counted
+                if self.dedup is not None:
+                    self.collapse_duplicates(page_info, ids_to_titles, 
+                        word_info)
+                word_postings = self.iter_relevance(word_info, page_info)
+            else:
+                # the same steps, streaming pages and spilling postings to disk
+                run_dir = tempfile.mkdtemp()
+                ids_to_titles = self.scan_titles(xml_file)
+                runs, page_info = self.spill_runs(xml_file, run_dir)
+                if self.dedup is not None:  # merge_relevance skips duplicates
+                    self.collapse_duplicates(page_info, ids_to_titles)
+                word_postings = self.merge_relevance(runs, page_info)
+            # populates ids_to_pageranks using the now-populated page_info
+            ids_to_pageranks = self.calc_ranks(page_info)
+            if self.reorder is not None:
+                self.ids_to_ordinals = self.assign_ordinals(page_info, 
+                    ids_to_pageranks)
+                ids_to_titles = {pid: ids_to_titles[pid] 
+                    for pid in self.ids_to_ordinals.keys()}
+                ids_to_pageranks = {pid: ids_to_pageranks[pid] 
+                    for pid in self.ids_to_ordinals.keys()}
+
+            ids_to_shards = None
+            if self.num_shards > 1:
+                ids_to_shards = self.assign_shards(list(ids_to_titles.keys()))
+            self.write_postings(words_file, word_postings, ids_to_shards,
+                ids_to_pageranks)
+            self.write_postings(words_file, self.iter_title_relevance(), 
+                ids_to_shards, ids_to_pageranks, "title")
+            self.write_normalization(words_file)  # may merge spilled stems
+            self.doc_store.close()  # only now replaces an earlier index's store
+        except BaseException:
+            self.doc_store.abort()
+            raise
+        finally:
+            self.doc_store = None
+            if run_dir is not None:
+                shutil.rmtree(run_dir)
+
+        if self.num_shards > 1:
+            self.write_shards(title_file, docs_file, ids_to_titles,
+                ids_to_pageranks, ids_to_shards)
+        else:
+            file_io.write_title_file(title_file, ids_to_titles)
+            file_io.write_docs_file(docs_file, ids_to_pageranks, 
+                self.ids_to_ordinals)
+        # rank.py reads how the docs file was sharded, and where the words 
+        # file is (to update its relevance * PageRank postings), from here
+        file_io.write_meta_file(file_io.companion_file(docs_file, "meta"),
+            {"shards": self.num_shards, "partition": self.partition,
+            "words": os.path.relpath(words_file, os.path.dirname(
+            os.path.abspath(docs_file)))})
+        file_io.write_links_file(file_io.companion_file(docs_file, "links"),
+            {pid: p_info.links for pid, p_info in page_info.items()})
+
+    def write_postings(self, words_file: str, word_postings, 
+    ids_to_shards: dict, ids_to_pageranks: dict, field=None):
+        """
+        Writes words and their term relevance scores to the words file one word
+        at a time, or splits each word's scores across the per-shard words 
+        files if the index is sharded.  If self.pagerank_weight is set, each 
+        words file also gets a companion <words-file>_pagerank.txt in which 
+        every score is already multiplied by the page's PageRank score raised 
+        to that power, so the querier's --pagerank mode can just add scores up.
+        Otherwise any such companions left by an earlier index are removed, 
+        since their scores would no longer match the docs file.
+
+        Parameters:
+        words_file -- filepath string for storing words & term relevance scores
+        word_postings -- iterable of (word, dict of page IDs to relevances)
+        ids_to_shards -- dict of page IDs to shard numbers, or None if unsharded
+        ids_to_pageranks -- dict of page IDs to PageRank scores
+        field -- name of the field the postings are for (e.g. "title"), which
+        are written to <words-file>_<field>.txt, or None for the whole page
+        """
+        if ids_to_shards is None:
+            paths = [words_file]
+        else:
+            paths = [file_io.companion_file(words_file, str(shard))
+                for shard in range(self.num_shards)]
+        if field is not None:
+            paths = [file_io.companion_file(path, field) for path in paths]
+        handles = [file_io.open_words_file(path) for path in paths]
+        static_handles = []
+        if self.pagerank_weight is None:
+            for path in paths:
+                self.remove_static_postings(path)
+        else:
+            static_handles = [file_io.open_words_file(
+                file_io.companion_file(path, "pagerank")) for path in paths]
+            static_ranks = {pid: rank ** self.pagerank_weight
+                for pid, rank in ids_to_pageranks.items()}
+        try:
+            for word, ids_to_relevance in word_postings:
+                if ids_to_shards is None:
+                    shard_postings = [ids_to_relevance]
+                else:
+                    shard_postings = [{} for _ in range(self.num_shards)]
+                    for pid, relevance in ids_to_relevance.items():
+                        shard_postings[ids_to_shards[pid]][pid] = relevance
+                for shard, postings in enumerate(shard_postings):
+                    if not postings:
+                        continue
+                    file_io.write_words_line(handles[shard], word, 
+                        self.renumbered(postings))
+                    if static_handles:
+                        file_io.write_words_line(static_handles[shard], word, 
+                            self.renumbered({pid: relevance * static_ranks[pid] 
+                            for pid, relevance in postings.items()}))
+        finally:
+            for handle in handles + static_handles:
+                handle.close()
+        if self.pagerank_weight is not None:
+            for shard, path in enumerate(paths):
+                self.write_static_meta(path, {pid: rank for pid, rank 
+                    in ids_to_pageranks.items() if ids_to_shards is None 
+                    or ids_to_shards[pid] == shard})
 
-        file_io.write_words_file(words_file, words_to_relevance)
-        file_io.write_title_file(title_file, ids_to_titles)
-        file_io.write_docs_file(docs_file, ids_to_pageranks)
+    def write_static_meta(self, words_file: str, ids_to_pageranks: dict):
+        """
+        Records the PageRank weight and a digest of the PageRank scores that a 
+        words file's relevance * PageRank companion was computed with, in 
+        <words-file>_pagerank_meta.txt, so that the querier only uses the 
+        companion while the docs file still holds those scores.
+
+        Parameters:
+        words_file -- filepath string of the (shard's or field's) words file
+        ids_to_pageranks -- dict of page IDs to the PageRank scores in the 
+        docs file that goes with the words file
+        """
+        file_io.write_meta_file(file_io.companion_file(
+            file_io.companion_file(words_file, "pagerank"), "meta"), {
+            "pagerank-weight": self.pagerank_weight,
+            "pagerank-digest": file_io.pagerank_digest(ids_to_pageranks)})
+
+    def remove_static_postings(self, words_file: str):
+        """
+        Deletes a words file's relevance * PageRank companion and its meta 
+        file, if an earlier index wrote them.
+
+        Parameters:
+        words_file -- filepath string of the (shard's or field's) words file
+        """
+        static_file = file_io.companion_file(words_file, "pagerank")
+        for path in [static_file, file_io.companion_file(static_file, "meta")]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def renumbered(self, ids_to_scores: dict) -> dict:
+        """
+        Replaces the page IDs of a word's postings with the pages' ordinals if 
+        the index is being reordered, listing the postings by ordinal.
+
+        Parameters:
+        ids_to_scores -- dict of page IDs to scores
+
+        Returns:
+        a dict of page ordinals (or the original page IDs) to scores
+        """
+        if self.ids_to_ordinals is None:
+            return ids_to_scores
+        return {self.ids_to_ordinals[pid]: ids_to_scores[pid] for pid in 
+            sorted(ids_to_scores.keys(), key=self.ids_to_ordinals.get)}
+
+    def assign_ordinals(self, page_info: dict, ids_to_pageranks: dict) -> dict:
+        """
+        Numbers the pages 0, 1, 2 ... in the order given by the page ordering
+        named by self.reorder, so that postings can refer to pages by these 
+        dense ordinals (listing the first pages of that ordering first) and the
+        querier only has to translate ordinals back to page IDs for results.
+
+        Parameters:
+        page_info -- dict keyed on page IDs with PageInfos as values
+        ids_to_pageranks -- dict of page IDs to PageRank scores
+
+        Returns:
+        a dict of page IDs to ordinals, in order of ordinal
+        """
+        ordering = getattr(self, self.ORDERINGS[self.reorder])
+        order = ordering(page_info, ids_to_pageranks)
+        return {pid: ordinal for ordinal, pid in enumerate(order)}
+
+    def pagerank_order(self, page_info: dict, ids_to_pageranks: dict) -> list:
+        """
+        Orders pages by descending PageRank score, so that the pages most 
+        likely to be top results come first in every postings list.
+
+        Parameters:
+        page_info -- dict keyed on page IDs with PageInfos as values
+        ids_to_pageranks -- dict of page IDs to PageRank scores
+
+        Returns:
+        a list of page IDs
+        """
+        return sorted(ids_to_pageranks.keys(), 
+            key=lambda pid: (-ids_to_pageranks[pid], pid))
+
+    def link_order(self, page_info: dict, ids_to_pageranks: dict) -> list:
+        """
+        Orders pages by a breadth-first traversal of the link graph, starting
+        from the highest ranked page not yet visited, so that pages that link
+        to each other (and tend to share words) get nearby ordinals.
+
+        Parameters:
+        page_info -- dict keyed on page IDs with PageInfos as values
+        ids_to_pageranks -- dict of page IDs to PageRank scores
+
+        Returns:
+        a list of page IDs
+        """
+        order = []
+        visited = set()
+        for start in self.pagerank_order(page_info, ids_to_pageranks):
+            if start in visited:
+                continue
+            visited.add(start)
+            to_visit = deque([start])
+            while to_visit:
+                pid = to_visit.popleft()
+                order.append(pid)
+                for link_id in sorted(page_info[pid].links, 
+                    key=lambda link_id: (-ids_to_pageranks[link_id], link_id)):
+                    if link_id not in visited:
+                        visited.add(link_id)
+                        to_visit.append(link_id)
+        return order
+
+    def write_normalization(self, words_file: str):
+        """
+        Records the exact tokenizing, stop word, and stemming settings used to 
+        build the index alongside the words file, together with every stem the 
+        indexer computed, so that the querier can normalize search terms the 
+        same way without having to import nltk on startup.
+
+        Parameters:
+        words_file -- filepath string for storing words & term relevance scores
+        """
+        file_io.write_meta_file(file_io.companion_file(words_file, "meta"), {
+            "tokens": self.n_regex,
+            "stemmer": "porter",
+            "stopwords": " ".join(sorted(self.stop_words))})
+        stems = self.stems
+        if self.stem_runs:  # the memo was spilled to disk under a memory budget
+            stems = spimi.merge_stems(self.stem_runs)
+        file_io.write_stems_file(file_io.companion_file(words_file, "stems"), 
+            stems)
+
+    def write_shards(self, title_file: str, docs_file: str, 
+    ids_to_titles: dict, ids_to_pageranks: dict, ids_to_shards: dict):
+        """
+        Writes a separate title and docs file for each of the self.num_shards
+        partitions of the corpus (write_postings writes their words files), 
+        along with a manifest recording how the corpus was sharded.  Relevance 
+        and PageRank scores are computed over the whole corpus before splitting,
+        so scores from different shards can be compared directly.
+
+        Parameters:
+        title_file -- base filepath string for the per-shard title files
+        docs_file -- base filepath string for the per-shard docs files
+        ids_to_titles -- dict of page IDs to titles
+        ids_to_pageranks -- dict of page IDs to PageRank scores
+        ids_to_shards -- dict of page IDs to shard numbers
+        """
+        shard_titles = [{} for _ in range(self.num_shards)]
+        shard_ranks = [{} for _ in range(self.num_shards)]
+        for pid, shard in ids_to_shards.items():
+            shard_titles[shard][pid] = ids_to_titles[pid]
+            shard_ranks[shard][pid] = ids_to_pageranks[pid]
+
+        for shard in range(self.num_shards):
+            tag = str(shard)
+            file_io.write_title_file(file_io.companion_file(title_file, tag),
+                shard_titles[shard])
+            file_io.write_docs_file(file_io.companion_file(docs_file, tag),
+                shard_ranks[shard], self.ids_to_ordinals)
+        file_io.write_meta_file(file_io.companion_file(title_file, "shards"),
+            {"shards": self.num_shards, "partition": self.partition})
+
+    def assign_shards(self, pids: list) -> dict:
+        """
+        Assigns every page to a shard, either by splitting the sorted page IDs
+        into contiguous ranges of (nearly) equal size or by hashing the IDs.
+
+        Parameters:
+        pids -- list of integer page IDs in the corpus
+
+        Returns:
+        a dict of page IDs to integer shard numbers
+        """
+        ids_to_shards = {}
+        if self.partition == "hash":
+            for pid in pids:
+                ids_to_shards[pid] = hash(pid) % self.num_shards
+        else:
+            for rank, pid in enumerate(sorted(pids)):
+                ids_to_shards[pid] = rank * self.num_shards // len(pids)
+        return ids_to_shards
 
     def get_pages(self, xml_file: str) -> tuple("list, dict"):
         """
@@ -91,7 +464,8 @@ class Indexer:
         self.title_to_id -- hashtable with page titles as keys and IDs as values
         self.num_pages -- the number of pages in the corpus
         """
-        root: "Element" = et.parse(xml_file).getroot()
+        with decompress.open_corpus(xml_file) as corpus:
+            root: "Element" = et.parse(corpus).getroot()
         pages = root.findall("page")
         ids_to_titles = {}
         self.num_pages = 0
@@ -107,7 +481,11 @@ class Indexer:
         """
         Calculates PageRank scores for the pages in the corpus using a while
         loop that recalculates PageRank scores based on the weights that pages
-        give one another) until the scores converge below a threshold.
+        give one another) until the scores converge below a threshold.  Rather 
+        than calling calc_weight for every pair of pages, each iteration adds up
+        the weights calc_weight would give in three parts: the random jump 
+        weight every page gives every page, the shares pages with no links 
+        give every other page, and the shares each page gives its links.
         
         Parameters:
         page_info -- a dict keyed on page IDs containing sets of linked pages
@@ -115,20 +493,32 @@ class Indexer:
         Returns:
         ids_to_pageranks -- a dict of page IDs to PageRank scores
         """
-        delta = 0.001
+        ee = self.damping
         previous_ranks = {}
         ids_to_pageranks = {}
-        for pid in self.title_to_id.values():
+        for pid in page_info.keys():
             previous_ranks[pid] = 0
             ids_to_pageranks[pid] = 1/self.num_pages
 
-        while self.euclidean_distance(previous_ranks, ids_to_pageranks) > delta:
+        while self.euclidean_distance(previous_ranks, ids_to_pageranks) \
+            > self.tolerance:
             previous_ranks = ids_to_pageranks.copy()
-            for link_id in self.title_to_id.values():
-                ids_to_pageranks[link_id] = 0
-                for pid in self.title_to_id.values():
-                    wkj = self.calc_weight(pid, link_id, page_info[pid].links)
-                    ids_to_pageranks[link_id] += wkj * previous_ranks[pid]
+            jump_share = ee/self.num_pages * sum(previous_ranks.values())
+            for link_id in page_info.keys():
+                ids_to_pageranks[link_id] = jump_share
+
+            no_links_share = 0
+            for pid, p_info in page_info.items():
+                num_links = len(p_info.links)
+                if num_links == 0 and self.num_pages > 1:  # gives to all others
+                    share = (1 - ee)/(self.num_pages - 1) * previous_ranks[pid]
+                    no_links_share += share
+                    ids_to_pageranks[pid] -= share
+                for link_id in p_info.links:
+                    ids_to_pageranks[link_id] += \
+                        (1 - ee)/num_links * previous_ranks[pid]
+            for link_id in page_info.keys():
+                ids_to_pageranks[link_id] += no_links_share
 
         return ids_to_pageranks
 
@@ -145,7 +535,7 @@ class Indexer:
         Returns:
         a float representing the weight that pid gives to other_id"""
         num_links = len(linked_pages)
-        ee = 0.15
+        ee = self.damping
 
         if num_links == 0 and pid != other_id:  # pid has no unique links
             return (1 - ee)/(self.num_pages - 1) + ee/self.num_pages
@@ -188,24 +578,80 @@ class Indexer:
         page_info -- dict keyed on page IDs with PageInfos as values (which keep
         track of sets of linked pages and per-page maximum word frequencies)
         """
-        words_to_relevance = {}
-
         # must scan all words and all pages before we can calculate relevances        
         word_info, page_info = self.process_pages(pages)
+        words_to_relevance = dict(self.iter_relevance(word_info, page_info))
+
+        return words_to_relevance, page_info
+
+    def iter_title_relevance(self):
+        """
+        Computes the title field's relevance scores one word at a time, like
+        iter_relevance, emptying self.title_info as it goes.  A word's score 
+        for a page is the number of times it appears in the page's title, 
+        times its idf among titles, times the title's field-length norm (one 
+        over the square root of the number of terms in the title), so that a 
+        search matching a short title exactly outscores a long title that 
+        merely contains it.  If spill_runs wrote runs of title counts, the 
+        scores come from merging those instead.
+
+        Returns:
+        yields (word, dict of page IDs to title relevance scores)
+        """
+        if self.title_runs:
+            yield from self.merge_title_relevance()
+            return
+        for word in list(self.title_info.keys()):
+            w_info = self.title_info.pop(word)
+            idf = math.log(self.num_pages/w_info.unique_page_appearances)
+            yield word, {pid: wc * idf / math.sqrt(self.title_lengths[pid]) 
+                for pid, wc in w_info.wrd_cts.items()}
+
+    def merge_title_relevance(self):
+        """
+        Computes the title field's relevance scores like iter_title_relevance,
+        but from the title runs that spill_runs wrote, merging them like 
+        merge_relevance does the runs of word counts.
+
+        Returns:
+        yields (word, dict of page IDs to title relevance scores) in word order
+        """
+        for word, postings in spimi.merge_runs(self.title_runs):
+            if self.duplicates:
+                postings = [(pid, wc) for pid, wc in postings 
+                    if pid not in self.duplicates]
+                if not postings:
+                    continue
+            idf = math.log(self.num_pages/len(postings))
+            yield word, {pid: wc * idf / math.sqrt(self.title_lengths[pid]) 
+                for pid, wc in postings}
+
+    def iter_relevance(self, word_info: dict, page_info: dict):
+        """
+        Computes term relevance scores one word at a time, removing each word's
+        WordInfo from word_info as soon as its scores are computed, so that the
+        word counts and the relevance scores are never both held in full.
+
+        Parameters:
+        word_info -- dict keyed on words with WordInfos as values, which is 
+        emptied as the words are consumed
+        page_info -- dict keyed on page IDs with PageInfos as values
 
-        for word in word_info.keys(): 
+        Returns:
+        yields (word, dict of page IDs to term relevance scores) in the order 
+        the words were first seen
+        """
+        for word in list(word_info.keys()):
+            w_info = word_info.pop(word)
             # convert n_i to inverse document frequency scores
-            n_i = word_info[word].unique_page_appearances
-            idf = math.log(self.num_pages/n_i)
+            idf = math.log(self.num_pages/w_info.unique_page_appearances)
 
-            words_to_relevance[word] = {}  # initialize
             # convert word counts to term frequency scores, compute relevances
-            for pid in word_info[word].wrd_cts.keys():
-                wc = word_info[word].wrd_cts[pid]
+            ids_to_relevance = {}
+            for pid, wc in w_info.wrd_cts.items():
                 tf = wc/page_info[pid].max_freq
-                words_to_relevance[word][pid] = tf * idf  
-
-        return words_to_relevance, page_info
+                ids_to_relevance[pid] = tf * idf
+            yield word, ids_to_relevance
 
     def process_pages(self, pages: list):
         """
@@ -230,19 +676,312 @@ class Indexer:
             pid = int(page.find('id').text.strip())
             p_info = PageInfo(0, set())  
             page_info[pid] = p_info
+            self.process_page(pid, page.find('title').text, 
+                page.find('text').text, word_info, p_info)
+
+        return word_info, page_info
+
+    def process_page(self, pid: int, pg_title: str, pg_text: str, 
+    word_info: dict, p_info: PageInfo):
+        """
+        Tokenizes the title and text of a single page and counts its words and
+        links, using separate helper methods for regular words vs links.
+
+        Parameters:
+        pid -- integer page ID of the given page
+        pg_title -- title of the page (or None if it's empty)
+        pg_text -- text of the page (or None if it's empty)
+        word_info -- dict keyed on words with WordInfos as values (which keep
+        track of #s of documents each word appears in, and per-page word counts)
+        p_info -- PageInfo object keeping track of the maximum word frequency 
+        and the set of linked pages for the given page
+        """
+        if self.doc_store is not None:
+            self.doc_store.add(pid, pg_text or "")
+        if self.dedup is not None:  # process_word collects the page's terms
+            self.page_terms = []
+        page_elems = []
+        if pg_title and pg_text:  # avoids empty titles or empty texts
+            page_elems = re.findall(self.n_regex, pg_title + " " + pg_text)
+        for elem in page_elems:
+            if re.match('\[\[[^\[]+?\]\]', elem):  # if elem is a link
+                self.handle_link(pid, elem[2:-2], word_info, p_info)
+            else:
+                self.process_word(pid, elem, word_info, p_info)
+        if pg_title:
+            self.process_title(pid, pg_title)
+        if self.page_terms is not None:
+            sig = minhash.signature(self.page_terms)
+            if sig is not None:  # pages without terms are never duplicates
+                self.signatures[pid] = sig
+            self.page_postings[pid] = len(set(self.page_terms))
+            self.page_terms = None
 
-            page_elems = []
-            pg_title = page.find('title').text
-            pg_text = page.find('text').text
-            if pg_title and pg_text:  # avoids empty titles or empty texts
-                page_elems = re.findall(self.n_regex, pg_title + " " + pg_text)
-            for elem in page_elems:
-                if re.match('\[\[[^\[]+?\]\]', elem):  # if elem is a link
-                    self.handle_link(pid, elem[2:-2], word_info, p_info)
+    def iter_pages(self, xml_file: str):
+        """
+        Streams the top-level pages of an XML file one at a time, discarding 
+        each page's parsed elements once it has been handled, so that memory use
+        doesn't grow with the size of the corpus.
+
+        Parameters:
+        xml_file -- filepath string of an XML-format corpus of wiki pages
+
+        Returns:
+        yields (page ID, title, text) tuples, where title or text may be None
+        """
+        depth = 0
+        with decompress.open_corpus(xml_file) as corpus:
+            for event, elem in et.iterparse(corpus, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 1:
+                        root = elem
+                    continue
+                depth -= 1
+                if depth == 1 and elem.tag == "page":  # same pages as get_pages
+                    yield (int(elem.find('id').text.strip()), 
+                        elem.find('title').text, elem.find('text').text)
+                    root.clear()  # drops the pages handled so far
+
+    def scan_titles(self, xml_file: str) -> dict:
+        """
+        Streaming counterpart of get_pages, which counts the pages in an XML 
+        file and creates lookup tables for their titles and IDs without keeping
+        the parsed pages in memory.
+
+        Parameters:
+        xml_file -- filepath string of an XML-format corpus of wiki pages
+
+        Returns:
+        ids_to_titles -- a hashtable with page IDs as keys and titles as values
+
+        Populates global variables:
+        self.title_to_id -- hashtable with page titles as keys and IDs as values
+        self.num_pages -- the number of pages in the corpus
+        """
+        ids_to_titles = {}
+        self.num_pages = 0
+        for pid, title, _ in self.iter_pages(xml_file):
+            title = title.strip()
+            ids_to_titles[pid] = title
+            self.title_to_id[title] = pid
+            self.num_pages += 1
+        return ids_to_titles
+
+    def spill_runs(self, xml_file: str, run_dir: str) -> tuple("list, dict"):
+        """
+        Counts the words and links of each page like process_pages, but keeps
+        only a compact run of word counts in memory and writes it to a sorted 
+        run file in run_dir whenever its estimated size exceeds the memory 
+        budget.  A page's counts never straddle two runs.  The memoized stems
+        count towards the budget too, and are spilled to a run of stems along 
+        with each run of counts (words are simply stemmed again if they turn 
+        up after that).  So do the title field's counts, which are spilled to a
+        run of title counts along with each run of counts.  Tables with an 
+        entry per page, like page_info, are not counted.
+
+        Parameters:
+        xml_file -- filepath string of an XML-format corpus of wiki pages
+        run_dir -- directory path in which run files are written
+
+        Returns:
+        runs -- list of the run file paths, in the order they were written
+        page_info -- dict keyed on page IDs with PageInfos as values (which keep
+        track of sets of linked pages and per-page maximum word frequencies)
+        """
+        budget = self.memory_budget * 1024 * 1024
+        runs = []
+        page_info = {}
+        words_to_counts = {}  # words to flat [pid, count, pid, count ...] lists
+        num_postings = 0
+
+        for pid, pg_title, pg_text in self.iter_pages(xml_file):
+            p_info = PageInfo(0, set())
+            page_info[pid] = p_info
+            page_words = {}  # this page's word counts, in WordInfos
+            self.process_page(pid, pg_title, pg_text, page_words, p_info)
+            for word, w_info in page_words.items():
+                if word not in words_to_counts:
+                    words_to_counts[word] = []
+                words_to_counts[word].extend((pid, w_info.wrd_cts[pid]))
+            num_postings += len(page_words)
+
+            if spimi.estimate_bytes(len(words_to_counts) + len(self.title_info),
+                num_postings + self.num_title_postings, len(self.stems)) > budget:
+                runs.append(self.spill_run(run_dir, len(runs), words_to_counts))
+                self.spill_titles(run_dir)
+                self.spill_stems(run_dir)
+                words_to_counts = {}
+                num_postings = 0
+        if words_to_counts or not runs:
+            runs.append(self.spill_run(run_dir, len(runs), words_to_counts))
+        if self.title_runs and self.title_info:  # so that all are in runs
+            self.spill_titles(run_dir)
+        if self.stem_runs and self.stems:  # so that every stem is in a run
+            self.spill_stems(run_dir)
+
+        self.num_runs = len(runs)
+        return runs, page_info
+
+    def spill_run(self, run_dir: str, run_num: int, words_to_counts: dict):
+        """
+        Writes an in-memory run of word counts to a new run file.
+
+        Parameters:
+        run_dir -- directory path in which run files are written
+        run_num -- integer number of runs written so far
+        words_to_counts -- dict of words to flat [pid, count, ...] lists
+
+        Returns:
+        the filepath string of the run file
+        """
+        run = os.path.join(run_dir, "run" + str(run_num) + ".txt")
+        spimi.write_run(run, words_to_counts)
+        return run
+
+    def spill_titles(self, run_dir: str):
+        """
+        Writes the title field's counts since the last spill to a new title 
+        run file and empties title_info.
+
+        Parameters:
+        run_dir -- directory path in which run files are written
+        """
+        run = os.path.join(run_dir, "title" + str(len(self.title_runs)) + 
+            ".txt")
+        spimi.write_run(run, {word: [n for pid, wc in w_info.wrd_cts.items() 
+            for n in (pid, wc)] for word, w_info in self.title_info.items()})
+        self.title_runs.append(run)
+        self.title_info = {}
+        self.num_title_postings = 0
+
+    def spill_stems(self, run_dir: str):
+        """
+        Writes the stems memoized since the last spill to a new stem run file 
+        and empties the memo.
+
+        Parameters:
+        run_dir -- directory path in which run files are written
+        """
+        run = os.path.join(run_dir, "stems" + str(len(self.stem_runs)) + ".txt")
+        spimi.write_stems_run(run, self.stems)
+        self.stem_runs.append(run)
+        self.stems = {}
+
+    def merge_relevance(self, runs: list, page_info: dict):
+        """
+        Merges the spilled run files and computes each word's term relevance 
+        scores as soon as all of its counts have been read, so that only one 
+        word's postings are ever in memory.
+
+        Parameters:
+        runs -- list of run file paths
+        page_info -- dict keyed on page IDs with PageInfos as values
+
+        Returns:
+        yields (word, dict of page IDs to term relevance scores) in word order
+        """
+        for word, postings in spimi.merge_runs(runs):
+            if self.duplicates:
+                postings = [(pid, wc) for pid, wc in postings 
+                    if pid not in self.duplicates]
+                if not postings:
+                    continue
+            idf = math.log(self.num_pages/len(postings))
+            ids_to_relevance = {}
+            for pid, wc in postings:
+                tf = wc/page_info[pid].max_freq
+                ids_to_relevance[pid] = tf * idf
+            yield word, ids_to_relevance
+
+    def process_title(self, pid: int, pg_title: str):
+        """
+        Counts the words of a page's title again on their own, in the title 
+        field's WordInfos, and records the title's length in terms.
+
+        Parameters:
+        pid -- integer page ID of the given page
+        pg_title -- title of the page
+        """
+        num_terms = 0
+        title_words = set()
+        for word in re.findall(self.n_regex, pg_title):
+            wrd = self.stemmed(word)
+            if wrd:
+                num_terms += 1
+                title_words.add(wrd)
+                if wrd not in self.title_info:
+                    self.title_info[wrd] = WordInfo(1, {pid: 1})
                 else:
-                    self.process_word(pid, elem, word_info, p_info)
+                    self.update_corpus(pid, self.title_info[wrd])
+        if num_terms:
+            self.title_lengths[pid] = num_terms
+        self.num_title_postings += len(title_words)
 
-        return word_info, page_info
+    def collapse_duplicates(self, page_info: dict, ids_to_titles: dict, 
+    word_info=None):
+        """
+        Finds clusters of near-duplicate pages from the MinHash signatures that
+        process_page computed, and keeps only one canonical page per cluster 
+        (the one that the most pages link to): the others are removed from 
+        page_info, ids_to_titles, word_info, and the title field's counts, 
+        their links are merged into the canonical page's links, and links to 
+        them are redirected to it.
+        Records how much the postings and the link graph shrank.
+
+        Parameters:
+        page_info -- dict keyed on page IDs with PageInfos as values
+        ids_to_titles -- dict of page IDs to titles
+        word_info -- dict keyed on words with WordInfos as values, or None if
+        the word counts were spilled to runs (merge_relevance then skips the 
+        removed pages' counts using self.duplicates)
+        """
+        num_links = sum([len(p_info.links) for p_info in page_info.values()])
+        num_postings = sum(self.page_postings.values())
+        in_links = {}
+        for p_info in page_info.values():
+            for linked_id in p_info.links:
+                in_links[linked_id] = in_links.get(linked_id, 0) + 1
+
+        for cluster in minhash.near_duplicates(self.signatures, self.dedup):
+            canonical = max(cluster, key=lambda pid: (in_links.get(pid, 0), 
+                -pid))
+            for pid in cluster:
+                if pid != canonical:
+                    self.duplicates[pid] = canonical
+
+        for pid, canonical in self.duplicates.items():
+            page_info[canonical].links |= page_info.pop(pid).links
+            self.title_to_id[ids_to_titles.pop(pid)] = canonical
+        for pid, p_info in page_info.items():
+            p_info.links = {self.duplicates.get(linked_id, linked_id)
+                for linked_id in p_info.links}
+            p_info.links.discard(pid)
+        if word_info is not None:
+            self.drop_duplicates(word_info)
+        self.drop_duplicates(self.title_info)
+        self.num_pages -= len(self.duplicates)
+
+        self.links_shrinkage = (num_links, 
+            sum([len(p_info.links) for p_info in page_info.values()]))
+        self.postings_shrinkage = (num_postings, num_postings - 
+            sum([self.page_postings[pid] for pid in self.duplicates.keys()]))
+
+    def drop_duplicates(self, word_info: dict):
+        """
+        Removes the word counts of collapsed duplicate pages from a table of
+        WordInfos, along with any words that only appeared on those pages.
+
+        Parameters:
+        word_info -- dict keyed on words with WordInfos as values
+        """
+        for word in list(word_info.keys()):
+            w_info = word_info[word]
+            for pid in w_info.wrd_cts.keys() & self.duplicates.keys():
+                del w_info.wrd_cts[pid]
+                w_info.unique_page_appearances -= 1
+            if not w_info.wrd_cts:
+                del word_info[word]
 
     def handle_link(self, pid: int, link_str: str, word_info, p_info: PageInfo):
         """
@@ -301,6 +1040,8 @@ class Indexer:
         """
         wrd = self.stemmed(w)
         if wrd:
+            if self.page_terms is not None:
+                self.page_terms.append(wrd)
             count = 1
             if wrd not in word_info:  # then add an entry for it into corpus
                 word_info[wrd] = word_info[wrd] = WordInfo(1, {pid: 1})
@@ -321,11 +1062,13 @@ class Indexer:
         a stemmed lower-cased version of the word if it's not a stop word, or 
         False otherwise
         """
-        STOP_WORDS = set(stopwords.words('english'))
-        stemmer = PorterStemmer()
+        lowered = word.lower()
+        if lowered in self.stems:  # each distinct word is only stemmed once
+            return self.stems[lowered]
 
-        if word.lower() not in STOP_WORDS:
-            return stemmer.stem(word.lower())
+        if lowered not in self.stop_words:
+            self.stems[lowered] = self.stemmer.stem(lowered)
+            return self.stems[lowered]
         else:
             return False
 
@@ -365,8 +1108,17 @@ if __name__ == "__main__":
     try:
         idxr = Indexer(sys.argv[1:])
         print("File successfully indexed!")
+        if idxr.dedup is not None:
+            print("Collapsed " + str(len(idxr.duplicates)) + " near-duplicate"
+                + " pages: postings " + " -> ".join(str(n) for n in 
+                idxr.postings_shrinkage) + ", links " + " -> ".join(str(n) 
+                for n in idxr.links_shrinkage))
     except ArgumentError:
         print("Try again. Must include the following 4 arguments: \n<pages-file"
-            + ">.xml <title-file>.txt <docs-file>.txt <words-file>.txt")
+            + ">.xml <title-file>.txt <docs-file>.txt <words-file>.txt\n"
+            + "(where the pages file may also be a .xml.bz2 or .xml.gz dump)\n"
+            + "optionally preceded by options such as --shards=<n> or "
+            + "--memory-budget=<mb> (see README.txt)")
     except FileNotFoundError:
-        print(sys.argv[1] + " not found. Try again.")
\ No newline at end of file
+        pages_file = [arg for arg in sys.argv[1:] if arg[:2] != "--"][0]
+        print(pages_file + " not found. Try again.")
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""
+Provides MinHash signatures of pages' term streams and the locality-sensitive
+hashing (LSH) that the indexer uses to find clusters of near-duplicate pages
+without comparing every pair of pages
+"""
+import hashlib
+
+NUM_HASHES = 64  # length of each page's MinHash signature
+SHINGLE_SIZE = 3  # consecutive terms hashed together as one shingle
+BIN_BITS = 58  # bits of a 64-bit hash left after choosing one of 64 bins
+
+
+def shingle_hash(shingle: str) -> int:
+    """
+    Hashes a shingle to 64 bits, the same way from one run to the next
+    :param shingle: space-separated terms of the shingle
+    :return: a 64-bit integer
+    """
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), 
+        digest_size=8).digest(), "little")
+
+
+def signature(terms: list) -> tuple:
+    """
+    Computes the MinHash signature of a page from its terms, treating the page
+    as the set of its shingles (runs of SHINGLE_SIZE consecutive terms), so
+    that the fraction of positions at which two signatures agree estimates the
+    Jaccard similarity of the two pages' shingle sets.  Rather than hashing 
+    every shingle NUM_HASHES times, each shingle is hashed once and the hash 
+    both picks one of NUM_HASHES bins and gives the value to take the minimum
+    of within that bin (one permutation hashing).  Bins that no shingle fell 
+    into borrow the value of the next nonempty bin, offset by how far away it
+    is, so that short pages still get comparable signatures
+    :param terms: the page's processed terms, in order
+    :return: a tuple of NUM_HASHES integers, or None if the page has no terms
+    """
+    if not terms:
+        return None
+    size = min(SHINGLE_SIZE, len(terms))
+    bins = [None] * NUM_HASHES
+    for i in range(len(terms) - size + 1):
+        hashed = shingle_hash(" ".join(terms[i:i + size]))
+        b, value = hashed % NUM_HASHES, hashed // NUM_HASHES
+        if bins[b] is None or value < bins[b]:
+            bins[b] = value
+    sig = []
+    for b in range(NUM_HASHES):
+        distance = 0
+        while bins[(b + distance) % NUM_HASHES] is None:
+            distance += 1
+        sig.append(bins[(b + distance) % NUM_HASHES] + (distance << BIN_BITS))
+    return tuple(sig)
+
+
+def similarity(sig1: tuple, sig2: tuple) -> float:
+    """
+    Estimates the Jaccard similarity of two pages from their signatures
+    :param sig1: MinHash signature of the first page
+    :param sig2: MinHash signature of the second page
+    :return: the fraction of signature positions at which the two agree
+    """
+    return sum([h1 == h2 for h1, h2 in zip(sig1, sig2)]) / len(sig1)
+
+
+def band_rows(threshold: float, num_hashes=NUM_HASHES) -> int:
+    """
+    Chooses how many signature rows go in each LSH band, so that pages whose
+    similarity is around threshold are likely to share at least one band.  A
+    pair of pages with similarity s shares a band of r rows with probability
+    1 - (1 - s^r)^(num_hashes / r), which rises steeply around (r / num_hashes)
+    ^ (1 / r); this picks the largest r for which that point is below threshold
+    :param threshold: minimum Jaccard similarity of near-duplicate pages
+    :param num_hashes: length of the signatures
+    :return: the number of rows per band, a divisor of num_hashes
+    """
+    rows = 1
+    for r in range(1, num_hashes + 1):
+        if num_hashes % r == 0 and (r / num_hashes) ** (1 / r) <= threshold:
+            rows = r
+    return rows
+
+
+def near_duplicates(signatures: dict, threshold: float) -> list:
+    """
+    Finds clusters of near-duplicate pages.  Each band of each signature is
+    hashed into a bucket, which keeps one page from each cluster that has a 
+    page in it.  A page is compared with the page kept for every other cluster
+    in its buckets, and pages whose estimated similarity is at least threshold
+    are joined with a union-find, so that many copies of the same page (like
+    stubs made from one template) cost time linear in their number
+    :param signatures: the dictionary of page ids -> MinHash signatures
+    :param threshold: minimum estimated Jaccard similarity of near-duplicates
+    :return: a list of clusters (sorted lists of at least 2 page ids)
+    """
+    parents = {pid: pid for pid in signatures.keys()}
+
+    def find(pid):
+        while parents[pid] != pid:
+            parents[pid] = parents[parents[pid]]  # halves the path
+            pid = parents[pid]
+        return pid
+
+    rows = band_rows(threshold)
+    for start in range(0, NUM_HASHES, rows):
+        buckets = {}  # this band's values to one page per cluster seen
+        for pid, sig in signatures.items():
+            band = sig[start:start + rows]
+            kept = {}  # the bucket's clusters' current roots to their pages
+            for other in buckets.get(band, []):
+                kept.setdefault(find(other), other)  # clusters may have merged
+            for other in kept.values():
+                if find(other) != find(pid) and \
+                    similarity(signatures[other], sig) >= threshold:
+                    parents[find(pid)] = find(other)
+            merged = {}
+            for other in list(kept.values()) + [pid]:
+                merged.setdefault(find(other), other)
+            buckets[band] = list(merged.values())
+
+    clusters = {}
+    for pid in signatures.keys():
+        root = find(pid)
+        if root not in clusters:
+            clusters[root] = []
+        clusters[root].append(pid)
+    return [sorted(cluster) for cluster in clusters.values()
+        if len(cluster) > 1]
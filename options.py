@@ -0,0 +1,44 @@
+"""
+Provides parsing for the optional --name or --name=value flags that can precede
+the positional file arguments of the indexer, querier, and related scripts
+"""
+from ctypes import ArgumentError
+
+
+def split_options(args: list, allowed: dict) -> tuple:
+    """
+    Separates leading command line options from the positional arguments that
+    follow them.  Options registered with bool are bare flags (--pagerank) that
+    are given the value True, while every other option must take the form
+    --name=value and has its value converted by the function registered for it.
+
+    Parameters:
+    args -- list of command line arguments
+    allowed -- dict of option names (without dashes) to conversion functions
+
+    Returns:
+    options -- dict of option names to converted values
+    positional -- list of the remaining (non-option) arguments
+
+    Throws:
+    ArgumentError if an option is unknown or its value can't be converted
+    """
+    options = {}
+    idx = 0
+    while idx < len(args) and args[idx].startswith("--"):
+        name, has_value, value = args[idx][2:].partition("=")
+        if name not in allowed:
+            raise ArgumentError
+        if allowed[name] is bool:  # flags never take a value
+            if has_value:
+                raise ArgumentError
+            options[name] = True
+        elif has_value:
+            try:
+                options[name] = allowed[name](value)
+            except ValueError:
+                raise ArgumentError
+        else:
+            raise ArgumentError
+        idx += 1
+    return options, args[idx:]
@@ -1,9 +1,9 @@
 import sys
 import re
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
 from ctypes import ArgumentError
 from file_io import *
+from docstore import DocStore
+from options import split_options
 
 class Query:
     """
@@ -11,6 +11,8 @@ class Query:
     optional argument that says to use PageRank. Also, runs a REPL to take in 
     and process search queries submitted by users. For valid queries, returns a 
     list of the top 10 documents by term relevance (and PageRank, if specified).
+    Title matches can be given extra weight with --title-boost=<b>, and 
+    --title-only searches titles alone (using only the title field's postings).
     """
     def __init__(self, args):
         self.pagerank = False
@@ -19,17 +21,35 @@ class Query:
         self.ids_to_titles = {}
         read_title_file(self.t_file, self.ids_to_titles)
 
-        self.words_to_relevance = {}
-        read_words_file(self.w_file, self.words_to_relevance)
-
+        # a reordered index refers to pages by ordinals in the words file
         self.ids_to_pagerank = {}
-        read_docs_file(self.d_file, self.ids_to_pagerank)
+        self.remapped_ids = {}  # ordinals to page IDs, if reordered
+        read_docs_file(self.d_file, self.ids_to_pagerank, self.remapped_ids)
+        self.doc_ranks = self.ids_to_pagerank
+        if self.remapped_ids:
+            self.doc_ranks = {ordinal: self.ids_to_pagerank[pid] 
+                for ordinal, pid in self.remapped_ids.items()}
+
+        # the title field's postings are folded into the whole page's postings
+        # once, with the title boost, so that scoring them costs nothing extra
+        self.static_scores = False
+        title_file = companion_file(self.w_file, "title")
+        if self.title_only:  # never reads the (much larger) words file
+            self.words_to_relevance = self.load_postings(title_file)
+        else:
+            self.words_to_relevance = self.load_postings(self.w_file)
+            if self.title_boost:
+                self.add_field(self.load_postings(title_file), self.title_boost)
+
+        self.stop_words = None  # normalization settings are loaded lazily
+        self.doc_store = None  # and so is the document store
        
     def process_arguments(self, args):
         """Returns a tuple of (title file, docs file, words file) if command
         line arguments are valid, otherwise raises an exception. If the 
         PageRank argument is specified, the value of the boolean variable
-        pagerank is set to True.
+        pagerank is set to True, and the title field options set title_boost
+        and title_only.
         
         Parameters:
         args -- list of command line arguments 
@@ -40,20 +60,89 @@ class Query:
         Throws:
         ArgumentError if the command line arguments are invalid 
         """
-       
-        file_list = []
-        if len(args) == 4 and args[0] == '--pagerank':
-            # do pagerank
-            self.pagerank = True
-            file_list = args[1:]
-        elif len(args) == 3 and all([arg[-4:] == '.txt' for arg in args]):
-            # we don't do pagerank
-           file_list = args
-        else:
+        options, file_list = split_options(args, {"pagerank": bool, 
+            "title-boost": float, "title-only": bool})
+        self.pagerank = options.get("pagerank", False)
+        self.title_boost = options.get("title-boost", 0.0)
+        self.title_only = options.get("title-only", False)
+        if self.title_boost < 0:
+            raise ArgumentError
+        if len(file_list) != 3 or \
+            not all([arg[-4:] == '.txt' for arg in file_list]):
             raise ArgumentError
 
         return file_list
 
+    def option_args(self) -> list:
+        """Returns the options this Query was given, as command line arguments,
+        so that they can be passed on to the Queries over an index's shards.
+
+        Returns:
+        A list of command line options
+        """
+        args = ["--pagerank"] if self.pagerank else []
+        if self.title_boost:
+            args.append("--title-boost=" + str(self.title_boost))
+        if self.title_only:
+            args.append("--title-only")
+        return args
+
+    def load_postings(self, words_file: str) -> dict:
+        """Reads a words file (or a field's words file), preferring the copy
+        that already factors PageRank in with --pagerank, in which case 
+        static_scores is set to True.
+
+        Parameters:
+        words_file -- filepath string of the words file
+
+        Returns:
+        A dict of words to dicts of page IDs to scores
+        """
+        words_to_relevance = {}
+        if self.pagerank and self.has_static_postings(words_file):
+            read_words_file(companion_file(words_file, "pagerank"), 
+                words_to_relevance)
+            self.static_scores = True
+            return words_to_relevance
+        read_words_file(words_file, words_to_relevance)
+        return words_to_relevance
+
+    def has_static_postings(self, words_file: str) -> bool:
+        """Checks whether a words file has a relevance * PageRank companion 
+        that was computed from the PageRank scores in the docs file, rather 
+        than from scores that have since been recalculated or reindexed.
+
+        Parameters:
+        words_file -- filepath string of the words file
+
+        Returns:
+        True if the companion exists and matches the docs file
+        """
+        meta = {}
+        try:
+            read_meta_file(companion_file(companion_file(words_file, 
+                "pagerank"), "meta"), meta)
+        except FileNotFoundError:
+            return False
+        return meta.get("pagerank-digest") == \
+            pagerank_digest(self.ids_to_pagerank)
+
+    def add_field(self, field_postings: dict, boost: float):
+        """Adds a field's scores, multiplied by the field's boost, into the 
+        scores of the words_to_relevance postings.
+
+        Parameters:
+        field_postings -- dict of words to dicts of page IDs to field scores
+        boost -- weight of the field's scores relative to the whole page's
+        """
+        for word, ids_to_score in field_postings.items():
+            if word not in self.words_to_relevance:
+                self.words_to_relevance[word] = {}
+            ids_to_relevance = self.words_to_relevance[word]
+            for pid, score in ids_to_score.items():
+                ids_to_relevance[pid] = \
+                    ids_to_relevance.get(pid, 0) + boost * score
+
     def calc_score(self, pagerank_score, rel_score) -> float:
         """Calculates score by multiplying the pagerank score by the relevance 
         score if PageRank is specified, otherwise just the relevance score.
@@ -81,27 +170,44 @@ class Query:
         Returns:
         A list of page titles corresponding to the highest scoring documents
         """
+        return [self.ids_to_titles[pid] for pid, _ in self.top_scores(words)]
+
+    def top_scores(self, words: list, k=10) -> list:
+        """Uses proccesed words from search query to calculate document scores
+        and returns the IDs and scores of the top, maximum of k, documents
+
+        Parameters:
+        words -- list of proccessed words from search query 
+        k -- maximum number of documents to return
+
+        Returns:
+        A list of (page ID, score) tuples in descending order by score
+        """
 
         ids_to_total_score = {}
 
         for word in words:
-            if word in self.words_to_relevance:
-                for pid in self.words_to_relevance[word].keys():
-                    rel = self.words_to_relevance[word][pid]
-                    rnk = self.ids_to_pagerank[pid]
-                    if pid not in ids_to_total_score:
-                        ids_to_total_score[pid] = self.calc_score(rnk, rel)
-                    else:
-                        ids_to_total_score[pid] += self.calc_score(rnk, rel) 
+            if word not in self.words_to_relevance:
+                continue
+            if self.static_scores:  # scores are already relevance * PageRank
+                for pid, score in self.words_to_relevance[word].items():
+                    ids_to_total_score[pid] = \
+                        ids_to_total_score.get(pid, 0) + score
+                continue
+            for pid in self.words_to_relevance[word].keys():
+                rel = self.words_to_relevance[word][pid]
+                rnk = self.doc_ranks[pid]
+                if pid not in ids_to_total_score:
+                    ids_to_total_score[pid] = self.calc_score(rnk, rel)
+                else:
+                    ids_to_total_score[pid] += self.calc_score(rnk, rel) 
         
         sorted_ids = sorted(ids_to_total_score.items(), key=lambda x: x[1], 
                     reverse=True)  # sort in descending order by score
-        results = []
-        num_results = len(sorted_ids)
-        num_results_to_return = min(10, num_results)
-        for i in range(num_results_to_return):
-            results.append(self.ids_to_titles[sorted_ids[i][0]])
-        return results
+        if self.remapped_ids:  # translates ordinals back to page IDs
+            return [(self.remapped_ids[doc], score) 
+                for doc, score in sorted_ids[:k]]
+        return sorted_ids[:k]
 
     def processed_terms(self, search_terms: str) -> list:
         """Processes query inputted by users through tokenizing, removing stop 
@@ -113,18 +219,123 @@ class Query:
         Returns:
         A list of processed words 
         """
-        n_regex = '''\[\[[^\[]+?\]\]|[a-zA-Z0-9]+'[a-zA-Z0-9]+|[a-zA-Z0-9]+'''
-        STOP_WORDS = set(stopwords.words('english'))
-        stemmer = PorterStemmer()
+        if self.stop_words is None:
+            self.load_normalization()
         processed_words = []
 
-        tokens = re.findall(n_regex, search_terms)
+        tokens = re.findall(self.n_regex, search_terms)
         for wrd in tokens:
-            if wrd.lower() not in STOP_WORDS:
-                processed_words.append(stemmer.stem(wrd.lower()))
+            if wrd.lower() not in self.stop_words:
+                processed_words.append(self.stemmed(wrd.lower()))
 
         return processed_words
 
+    def load_normalization(self):
+        """Loads the tokenizing and stop word settings, along with the table of
+        stems, that the indexer recorded next to the words file.  Indexes 
+        written before those files existed fall back on nltk's stop words.
+        """
+        meta = {}
+        self.stems = {}
+        try:
+            read_meta_file(companion_file(self.w_file, "meta"), meta)
+            read_stems_file(companion_file(self.w_file, "stems"), self.stems)
+        except FileNotFoundError:
+            from nltk.corpus import stopwords  # deferred, since it's slow
+            meta["stopwords"] = " ".join(stopwords.words('english'))
+        self.n_regex = meta.get("tokens", 
+            '''\[\[[^\[]+?\]\]|[a-zA-Z0-9]+'[a-zA-Z0-9]+|[a-zA-Z0-9]+''')
+        self.stop_words = set(meta["stopwords"].split(" "))
+        self.stemmer = None
+
+    def stemmed(self, word: str) -> str:
+        """Returns the stem of a lower-cased non-stop word, looking it up in the
+        indexer's table of stems first and only importing nltk's stemmer when 
+        a word never appeared in the corpus.
+
+        Parameters:
+        word -- lower-cased search word
+
+        Returns:
+        The stem of the word
+        """
+        if word not in self.stems:
+            if self.stemmer is None:
+                from nltk.stem import PorterStemmer  # deferred, since it's slow
+                self.stemmer = PorterStemmer()
+            self.stems[word] = self.stemmer.stem(word)
+        return self.stems[word]
+
+    def load_doc_store(self):
+        """Opens the document store that the indexer wrote alongside the title
+        file, or records that there isn't one (for older indexes)."""
+        try:
+            self.doc_store = DocStore(companion_file(self.t_file, "store", 
+                ".bin"), companion_file(self.t_file, "store"))
+        except FileNotFoundError:
+            self.doc_store = False
+
+    def snippet(self, pid: int, words: list, width=160) -> str:
+        """Extracts a short passage of a page's text starting just before the 
+        first appearance of a search word, with every search word in the 
+        passage highlighted between double asterisks.  Only the compressed 
+        block of the document store holding the page is read.  The text is
+        split into words the way the indexer split it, and words are only 
+        matched through the indexer's table of stems, so that building 
+        snippets never needs nltk's stemmer.
+
+        Parameters:
+        pid -- page ID of a search result
+        words -- list of proccessed words from search query
+        width -- approximate number of characters in the passage
+
+        Returns:
+        The passage, or None if the page's text isn't available
+        """
+        if self.doc_store is None:
+            self.load_doc_store()
+        text = self.doc_store.text(pid) if self.doc_store else None
+        if not text:
+            return None
+        if self.stop_words is None:
+            self.load_normalization()
+        # shows links as their link text, and collapses whitespace.  A link's
+        # text is fenced with NUL characters (removed from the passage at the
+        # end) so that, as in the indexer, it never runs into the text around
+        # it to form a word like "tornadoes" from "[[tornado]]es"
+        link_regex = '\\[\\[(?:[^\\[\\]|]*\\|)?([^\\[\\]]*)\\]\\]'
+        text = re.sub(link_regex, lambda link: "\0" + link.group(1) + "\0",
+            text)
+        text = " ".join(text.split())
+
+        words = set(words)
+        start = None
+        hits = []
+        for match in re.finditer("[a-zA-Z0-9]+'[a-zA-Z0-9]+|[a-zA-Z0-9]+", text):
+            if start is not None and match.end() > start + width:
+                break
+            wrd = match.group().lower()
+            if wrd not in self.stop_words and self.stems.get(wrd) in words:
+                if start is None:  # passage starts a little before first hit
+                    start = text.rfind(" ", 0, max(0, match.start() - width//4))
+                    start += 1
+                hits.append(match.span())
+        if start is None:
+            start = 0
+        end = text.find(" ", start + width)
+        if end == -1:
+            end = len(text)
+
+        pieces = ["..." if start > 0 else ""]
+        last = start
+        for hit_start, hit_end in hits:
+            pieces.extend([text[last:hit_start], "**", text[hit_start:hit_end], 
+                "**"])
+            last = hit_end
+        pieces.append(text[last:end])
+        pieces.append("..." if end < len(text) else "")
+        return "".join(pieces).replace("\0", "")
+
     def print_results(self, search_terms: str):
         """Passes the user query into helper methods to print the top results 
         (maximum of ten), or an informative message if there are no results.
@@ -133,18 +344,22 @@ class Query:
         search_terms -- user-input string of search terms 
 
         Returns:
-        Prints list of page titles corresponding to the top (max ten) documents
-        or a message if the query returns no results
+        Prints list of page titles corresponding to the top (max ten) documents,
+        each followed by a snippet of its text if the index has a document 
+        store, or a message if the query returns no results
         
         """
         processed_terms = self.processed_terms(search_terms)
-        results = self.retrieve_results(processed_terms)
+        results = self.top_scores(processed_terms)
 
         if not results:
             print("No results for that search.")
         
-        for idx, result in enumerate(results):
-            print(str(idx + 1) + " " + result)
+        for idx, (pid, _) in enumerate(results):
+            print(str(idx + 1) + " " + self.ids_to_titles[pid])
+            snippet = self.snippet(pid, processed_terms)
+            if snippet:
+                print("    " + snippet)
 
 if __name__ == "__main__":
     """
@@ -164,6 +379,7 @@ if __name__ == "__main__":
     except ArgumentError:
         print("Invalid command line arguments, try again.  Arguments must take"
         + " the form: \n    --pagerank <title-file>.txt <docs-file>.txt" 
-        + " <words-file>.txt \nwhere --pagerank is an optional argument.")
+        + " <words-file>.txt \nwhere --pagerank is an optional argument"
+        + " (as are --title-boost=<b> and --title-only).")
 
     
\ No newline at end of file
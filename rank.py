@@ -0,0 +1,147 @@
+# rank.py
+from ctypes import ArgumentError
+import os
+import sys
+from index import Indexer, PageInfo
+from options import split_options
+import file_io
+
+class Ranker(Indexer):
+    """
+    Objects of this class recompute the PageRank scores of an already indexed
+    corpus from the link graph file that the Indexer writes next to the docs
+    file, and rewrite the docs file with the new scores.  This makes it cheap
+    to try out other damping factors or convergence tolerances, since the XML
+    corpus never has to be parsed or tokenized again.  Sharded indexes are 
+    rewritten shard by shard, split the same way as the indexer recorded in
+    <docs-file>_meta.txt, and any relevance * PageRank postings the indexer 
+    wrote are recomputed with the new scores.
+    """
+    def __init__(self, args: list):
+        options, args = split_options(args, {"damping": float, 
+            "tolerance": float})
+        self.set_rank_options(options)
+        if len(args) != 1 or len(args[0]) < 4 or args[0][-4:] != '.txt':
+            raise ArgumentError
+
+        self.write_docs_files(args[0])
+
+    def write_docs_files(self, docs_file: str):
+        """
+        Reads the link graph written alongside a docs file, recalculates the
+        PageRank scores, and writes them back into the docs file (or into the
+        per-shard docs files, for an index that was split into shards).
+
+        Parameters:
+        docs_file -- filepath string for storing page IDs and PageRank scores
+        """
+        index_info = {}
+        try:
+            file_io.read_meta_file(file_io.companion_file(docs_file, "meta"),
+                index_info)
+        except FileNotFoundError:  # written before sharding was recorded
+            pass
+        self.num_shards = int(index_info.get("shards", 1))
+        self.partition = index_info.get("partition", "range")
+
+        ids_to_links = {}
+        file_io.read_links_file(file_io.companion_file(docs_file, "links"),
+            ids_to_links)
+        page_info = {}
+        for pid, links in ids_to_links.items():
+            page_info[pid] = PageInfo(0, links)
+        self.num_pages = len(page_info)
+
+        ids_to_pageranks = self.calc_ranks(page_info)
+
+        words_file = None
+        if "words" in index_info:
+            words_file = os.path.join(os.path.dirname(os.path.abspath(
+                docs_file)), index_info["words"])
+
+        if self.num_shards == 1:
+            self.rewrite_docs_file(docs_file, ids_to_pageranks)
+            if words_file is not None:
+                self.rewrite_static_postings(docs_file, words_file)
+            return
+        shard_ranks = [{} for _ in range(self.num_shards)]
+        for pid, shard in self.assign_shards(list(page_info.keys())).items():
+            shard_ranks[shard][pid] = ids_to_pageranks[pid]
+        for shard in range(self.num_shards):
+            tag = str(shard)
+            self.rewrite_docs_file(file_io.companion_file(docs_file, tag), 
+                shard_ranks[shard])
+            if words_file is not None:
+                self.rewrite_static_postings(file_io.companion_file(docs_file,
+                    tag), file_io.companion_file(words_file, tag))
+
+    def rewrite_docs_file(self, docs_file: str, ids_to_pageranks: dict):
+        """
+        Overwrites a docs file with new PageRank scores, keeping the ordinals
+        it records if the index was reordered (the words file still refers to
+        pages by those ordinals, so they can't change without reindexing).
+
+        Parameters:
+        docs_file -- filepath string for storing page IDs and PageRank scores
+        ids_to_pageranks -- dict of page IDs to new PageRank scores
+        """
+        ordinals_to_ids = {}
+        try:
+            file_io.read_docs_file(docs_file, {}, ordinals_to_ids)
+        except FileNotFoundError:
+            pass
+        ids_to_ordinals = None
+        if ordinals_to_ids:
+            ids_to_ordinals = {pid: ordinal 
+                for ordinal, pid in sorted(ordinals_to_ids.items())}
+            ids_to_pageranks = {pid: ids_to_pageranks[pid] 
+                for pid in ids_to_ordinals.keys()}
+        file_io.write_docs_file(docs_file, ids_to_pageranks, ids_to_ordinals)
+
+    def rewrite_static_postings(self, docs_file: str, words_file: str):
+        """
+        Recomputes the relevance * PageRank companions of a words file and of
+        its title field's words file from the (just rewritten) docs file, with
+        the PageRank weight they were written with.  Words files without such
+        a companion are left alone.
+
+        Parameters:
+        docs_file -- filepath string of the (shard's) docs file
+        words_file -- filepath string of the (shard's) words file
+        """
+        ids_to_pageranks = {}
+        ordinals_to_ids = {}
+        file_io.read_docs_file(docs_file, ids_to_pageranks, ordinals_to_ids)
+        for path in [words_file, file_io.companion_file(words_file, "title")]:
+            static_file = file_io.companion_file(path, "pagerank")
+            meta = {}
+            try:
+                file_io.read_meta_file(file_io.companion_file(static_file, 
+                    "meta"), meta)
+            except FileNotFoundError:
+                continue
+            self.pagerank_weight = float(meta["pagerank-weight"])
+            # the words file refers to pages by ordinal if it was reordered
+            keys_to_ids = ordinals_to_ids or {pid: pid 
+                for pid in ids_to_pageranks.keys()}
+            static_ranks = {key: ids_to_pageranks[pid] ** self.pagerank_weight
+                for key, pid in keys_to_ids.items()}
+            with file_io.open_words_file(static_file) as static_fh:
+                for word, ids_to_relevance in file_io.iter_words_file(path):
+                    file_io.write_words_line(static_fh, word, {key: 
+                        relevance * static_ranks[key] 
+                        for key, relevance in ids_to_relevance.items()})
+            self.write_static_meta(path, ids_to_pageranks)
+
+if __name__ == "__main__":
+    """
+    Passes command-line arguments into Ranker constructor and catches errors.
+    """
+    try:
+        rnkr = Ranker(sys.argv[1:])
+        print("PageRank scores successfully recalculated!")
+    except ArgumentError:
+        print("Try again. Must include the following argument: \n<docs-file>"
+            + ".txt\noptionally preceded by --damping=<d> --tolerance=<t>")
+    except FileNotFoundError:
+        print("Link graph for " + sys.argv[-1] + " not found. Try again.")
@@ -0,0 +1,176 @@
+"""
+Provides reading and writing of the sorted postings runs that the indexer spills
+to disk in its memory-budgeted (single-pass in-memory, or SPIMI) mode, along 
+with runs of the stems it has memoized, and the k-way merges that combine those
+runs back into one postings list (or stem) per word
+"""
+import os
+import heapq
+
+POSTING_BYTES = 80  # rough in-memory cost of one page id and count in a run
+WORD_BYTES = 250  # rough in-memory cost of a word and its (empty) postings list
+STEM_BYTES = 200  # rough in-memory cost of a memoized word and its stem
+MAX_FAN_IN = 64  # most runs merged at once, so only this many files are open
+
+
+def estimate_bytes(num_words: int, num_postings: int, num_stems=0) -> int:
+    """
+    Estimates how much memory an in-memory run (and the stems memoized since
+    the last run was spilled) is using
+    :param num_words: number of distinct words in the run
+    :param num_postings: number of (page id, count) pairs in the run
+    :param num_stems: number of memoized stems
+    :return: the estimated number of bytes
+    """
+    return num_words * WORD_BYTES + num_postings * POSTING_BYTES + \
+        num_stems * STEM_BYTES
+
+
+def write_run(run: str, words_to_counts: dict):
+    """
+    Writes an in-memory run to disk sorted by word, so that runs can be merged
+    output looks like:
+    word1 id1_1 count1_1 id1_2 count1_2 ...
+    word2 id2_1 count2_1 id2_2 count2_2 ...
+    :param run: the file that will get written to
+    :param words_to_counts: the dictionary of words -> flat [id, count, ...] lists
+    :return: n/a
+    """
+    with open(run, "w") as run_fh:
+        for word in sorted(words_to_counts.keys()):
+            run_fh.write(word + " " +
+                " ".join([str(n) for n in words_to_counts[word]]) + "\n")
+
+
+def read_run(run: str):
+    """
+    generator that reads back a run written by write_run, one word at a time
+    :param run: the file name of the run
+    :return: yields (word, list of (page id, count) tuples) in sorted word order
+    """
+    with open(run, "r") as run_fh:
+        for line in run_fh:
+            split = line.split()
+            counts = [int(n) for n in split[1:]]
+            yield split[0], list(zip(counts[0::2], counts[1::2]))
+
+
+def write_stems_run(run: str, words_to_stems: dict):
+    """
+    Writes memoized stems to disk sorted by word, so that stem runs can be merged
+    output looks like:
+    word1 stem1
+    word2 stem2
+    :param run: the file that will get written to
+    :param words_to_stems: the dictionary of words -> stems
+    :return: n/a
+    """
+    with open(run, "w") as run_fh:
+        for word in sorted(words_to_stems.keys()):
+            run_fh.write(word + " " + words_to_stems[word] + "\n")
+
+
+def read_stems_run(run: str):
+    """
+    generator that reads back a run written by write_stems_run
+    :param run: the file name of the run
+    :return: yields (word, stem) in sorted word order
+    """
+    with open(run, "r") as run_fh:
+        for line in run_fh:
+            word, stem = line.split()
+            yield word, stem
+
+
+def merge_runs(runs: list, fan_in=None):
+    """
+    generator that k-way merges sorted runs, so that only one line per run and
+    the postings of a single word are held in memory at a time.  If there are
+    more than fan_in runs, groups of them are first merged into intermediate 
+    runs, as many times as it takes
+    :param runs: list of run file names
+    :param fan_in: most runs to merge at once (MAX_FAN_IN by default)
+    :return: yields (word, list of (page id, count) tuples) in sorted word order
+    """
+    runs = reduce_runs(runs, merge_postings, lambda word, postings: word + 
+        " " + " ".join([str(n) for posting in postings for n in posting]), 
+        fan_in)
+    yield from merge_postings(runs)
+
+
+def merge_stems(runs: list, fan_in=None):
+    """
+    generator that k-way merges sorted stem runs, dropping the repeats of words
+    that were stemmed again after an earlier run of stems was spilled
+    :param runs: list of stem run file names
+    :param fan_in: most runs to merge at once (MAX_FAN_IN by default)
+    :return: yields (word, stem) in sorted word order, once per word
+    """
+    runs = reduce_runs(runs, unique_stems, lambda word, stem: word + " " + stem,
+        fan_in)
+    yield from unique_stems(runs)
+
+
+def reduce_runs(runs: list, merge, format_line, fan_in=None) -> list:
+    """
+    Merges groups of fan_in runs into intermediate runs (deleting the merged 
+    runs) until at most fan_in runs are left, so that a merge never has more
+    than fan_in files open at once
+    :param runs: list of run file names
+    :param merge: generator function that merges a list of runs into lines
+    :param format_line: function that formats what merge yields as a run line
+    :param fan_in: most runs to merge at once (MAX_FAN_IN by default)
+    :return: the list of remaining run file names
+    """
+    fan_in = fan_in or MAX_FAN_IN
+    level = 0
+    while len(runs) > fan_in:
+        level += 1
+        merged = []
+        for first in range(0, len(runs), fan_in):
+            group = runs[first:first + fan_in]
+            if len(group) == 1:
+                merged.append(group[0])
+                continue
+            base, ext = os.path.splitext(group[0])
+            run = base + "_" + str(level) + ext
+            with open(run, "w") as run_fh:
+                for line in merge(group):
+                    run_fh.write(format_line(*line) + "\n")
+            for old_run in group:
+                os.remove(old_run)
+            merged.append(run)
+        runs = merged
+    return runs
+
+
+def unique_stems(runs: list):
+    """
+    generator that merges stem runs in a single pass, yielding each word once
+    :param runs: list of stem run file names
+    :return: yields (word, stem) in sorted word order
+    """
+    last_word = None
+    for word, stem in heapq.merge(*[read_stems_run(run) for run in runs]):
+        if word != last_word:
+            yield word, stem
+            last_word = word
+
+
+def merge_postings(runs: list):
+    """
+    generator that merges postings runs in a single pass
+    :param runs: list of run file names
+    :return: yields (word, list of (page id, count) tuples) in sorted word order
+    """
+    current_word = None
+    postings = []
+    for word, counts in heapq.merge(*[read_run(run) for run in runs],
+        key=lambda x: x[0]):
+        if word != current_word:
+            if current_word is not None:
+                yield current_word, postings
+            current_word, postings = word, []
+        postings.extend(counts)
+    if current_word is not None:
+        yield current_word, postings
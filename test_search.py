@@ -1,8 +1,21 @@
+import os
+import sys
+import bz2
+import gzip
+import decompress
+import spimi
 import pytest
+import subprocess
 from index import *
 from query import *
 from file_io import *
+from coordinator import Coordinator
+from rank import Ranker
+from docstore import DocStore, DocStoreWriter
+from vector_query import VectorQuery
+import minhash
 import xml.etree.ElementTree as et
+from nltk.corpus import stopwords
 
 # many of the test methods use a common set of arguments
 txt_args = ["title_file.txt", "docs_file.txt", "words_file.txt"]
@@ -93,6 +106,29 @@ def test_relevance1():
         for pid in expected_wtr[word].keys():
                 assert words_to_relevance[word][pid] == expected_wtr[word][pid]
 
+def test_iter_relevance(tmp_path):
+    """
+    Tests that streaming term relevance scores one word at a time gives the 
+    same scores as calc_relevance, in the same word order, and empties the 
+    word counts as it goes.
+    """
+    files = [str(tmp_path / name) for name in txt_args]
+    args = ["test_idf_wiki.xml"] + files
+    ind = Indexer(args)
+    words_to_relevance = ind.calc_relevance(ind.get_pages(args[0])[0])[0]
+    word_info, page_info = ind.process_pages(ind.get_pages(args[0])[0])
+    num_words = len(word_info)
+    streamed = ind.iter_relevance(word_info, page_info)
+    word, ids_to_relevance = next(streamed)
+    assert len(word_info) == num_words - 1 and word not in word_info
+    assert ids_to_relevance == words_to_relevance[word]
+    assert [word] + [w for w, _ in streamed] == list(words_to_relevance.keys())
+    assert word_info == {}
+
+    actual = {}
+    read_words_file(files[2], actual)
+    assert actual == words_to_relevance
+
 def test_revelance2():
     """
     Tests a slightly larger wiki with every type of link, including where the 
@@ -262,4 +298,523 @@ def test_ranks_100():
     sum = 0
     for rank in ids_to_pageranks.values():
         sum += rank
-    assert sum == pytest.approx(1) # testing the sum of pagerank scores equals 1
\ No newline at end of file
+    assert sum == pytest.approx(1) # testing the sum of pagerank scores equals 1
+
+def test_sharded_search(tmp_path):
+    """
+    Tests that a sharded index queried through the Coordinator returns exactly
+    the same top results as the single index, for both range and hash
+    partitioning and with or without PageRank, and that errors in the shard
+    workers are raised by the Coordinator instead of leaving it waiting.
+    """
+    files = [str(tmp_path / name) for name in txt_args]
+    shard_args = [str(tmp_path / ("shard_" + name)) for name in txt_args]
+    Indexer(["test_wiki_11.xml"] + files)
+    for partition in ["range", "hash"]:
+        Indexer(["--shards=3", "--partition=" + partition, "test_wiki_11.xml"] 
+            + shard_args)
+        for flag in [[], ["--pagerank"]]:
+            querier = Query(flag + files)
+            coordinator = Coordinator(flag + shard_args)
+            try:
+                for terms in ["orange", "bUiLds", "blood orange", "cart", ""]:
+                    words = querier.processed_terms(terms)
+                    expected = querier.top_scores(words)
+                    actual = coordinator.top_scores(words)
+                    assert [s for _, s in actual] == \
+                        pytest.approx([s for _, s in expected])
+                    assert set(coordinator.retrieve_results(words)) <= \
+                        set(querier.ids_to_titles.values())
+            finally:
+                coordinator.close()
+
+    coordinator = Coordinator(shard_args)
+    try:
+        coordinator.workers[1].terminate()
+        coordinator.workers[1].join()
+        with pytest.raises(RuntimeError):
+            coordinator.top_scores(["orang"])
+    finally:
+        coordinator.close()
+
+    title_shard = companion_file(shard_args[0], "0")
+    with open(title_shard, "w") as title_fh:  # no titles for shard 0's pages
+        title_fh.write("")
+    coordinator = Coordinator(shard_args)
+    try:
+        with pytest.raises(KeyError):
+            coordinator.top_scores(["orang"])
+        assert coordinator.top_scores(["zzz"]) == []  # workers keep serving
+    finally:
+        coordinator.close()
+
+    with open(companion_file(shard_args[1], "0"), "w") as docs_fh:
+        docs_fh.write("not a pagerank\n")
+    with pytest.raises(ValueError):
+        Coordinator(shard_args)
+
+    with pytest.raises(ArgumentError):
+        Indexer(["--shards=0", "test_wiki_11.xml"] + shard_args)
+    with pytest.raises(ArgumentError):
+        Indexer(["--partition=modulo", "test_wiki_11.xml"] + shard_args)
+
+def test_baked_normalization(tmp_path):
+    """
+    Tests that the querier normalizes search terms with the stop words and stems
+    recorded by the indexer, without needing nltk's stemmer for words that 
+    appear in the corpus (or nltk at all to print results and their snippets),
+    and that it matches the nltk-based normalization used for indexes that 
+    don't have those files.
+    """
+    files = [str(tmp_path / name) for name in txt_args]
+    Indexer(["test_wiki_11.xml"] + files)
+    querier = Query(files)
+    search = "The oranges BUILD in New York, Blood buildings"
+    baked_terms = querier.processed_terms(search)
+    assert querier.stemmer is None  # every word was in the table of stems
+    assert "the" not in baked_terms and "in" not in baked_terms
+    assert querier.processed_terms("bUiLds") == ["build"]  # not in the corpus
+
+    meta = {}
+    read_meta_file(companion_file(files[2], "meta"), meta)
+    assert set(meta["stopwords"].split(" ")) == set(stopwords.words('english'))
+
+    # this process has imported nltk already, so a fresh one has to check, 
+    # with results whose text has words the corpus doesn't, like "oranges"
+    writer = DocStoreWriter(companion_file(files[0], "store", ".bin"), 
+        companion_file(files[0], "store"))
+    for pid in querier.ids_to_titles:
+        writer.add(pid, "[[orange]]s and [[Juice|juice]]rs")
+    writer.close()
+    check = ("import sys\nfrom query import Query\nq = Query(sys.argv[1:])\n"
+        + "q.print_results('blood orange juice')\n"
+        + "print('nltk' in sys.modules)\n")
+    output = subprocess.run([sys.executable, "-c", check] + files,
+        capture_output=True, text=True, check=True).stdout
+    assert "**orange**s" in output and output.split()[-1] == "False"
+
+    os.remove(companion_file(files[2], "meta"))
+    os.remove(companion_file(files[2], "stems"))
+    legacy_querier = Query(files)
+    assert legacy_querier.processed_terms(search) == baked_terms
+    assert legacy_querier.processed_terms("skyscrapers") == ["skyscrap"]
+
+def test_rerank_from_links(tmp_path):
+    """
+    Tests that PageRank scores recomputed from the saved link graph match the
+    ones the indexer computed, and that the damping factor and tolerance can be
+    changed without reindexing.
+    """
+    files = [str(tmp_path / name) for name in txt_args]
+    Indexer(["PageRankExample2.xml"] + files)
+    indexed_ranks = {}
+    read_docs_file(files[1], indexed_ranks)
+
+    Ranker([files[1]])
+    reranked = {}
+    read_docs_file(files[1], reranked)
+    assert reranked == pytest.approx(indexed_ranks)
+
+    Ranker(["--damping=0.3", "--tolerance=0.00001", files[1]])
+    expected_files = [str(tmp_path / ("expected_" + name)) for name in txt_args]
+    Indexer(["--damping=0.3", "--tolerance=0.00001", "PageRankExample2.xml"] 
+        + expected_files)
+    reranked = {}
+    read_docs_file(files[1], reranked)
+    reindexed = {}
+    read_docs_file(expected_files[1], reindexed)
+    assert reranked == pytest.approx(reindexed)
+    assert reranked != pytest.approx(indexed_ranks, abs=.0001)
+    assert sum(reranked.values()) == pytest.approx(1)
+
+    with pytest.raises(ArgumentError):
+        Ranker(["--damping=2", files[1]])
+    with pytest.raises(ArgumentError):  # read from <docs-file>_meta.txt now
+        Ranker(["--shards=2", files[1]])
+
+    # a sharded index is reranked shard by shard, split as it was indexed
+    Indexer(["--shards=2", "--partition=hash", "PageRankExample2.xml"] + files)
+    indexed_shards = []
+    for shard in range(2):
+        ranks = {}
+        read_docs_file(companion_file(files[1], str(shard)), ranks)
+        indexed_shards.append(ranks)
+    Ranker(["--damping=0.3", files[1]])
+    total = 0
+    for shard in range(2):
+        reranked = {}
+        read_docs_file(companion_file(files[1], str(shard)), reranked)
+        assert reranked.keys() == indexed_shards[shard].keys()
+        assert reranked != pytest.approx(indexed_shards[shard], abs=.0001)
+        total += sum(reranked.values())
+    assert total == pytest.approx(1)
+
+def test_memory_budget(tmp_path, monkeypatch):
+    """
+    Tests that indexing with a memory budget small enough to spill a postings 
+    run (and runs of title counts and stems) to disk for every page writes the
+    same term relevance scores, title field scores, titles, PageRank scores, 
+    and stems as indexing entirely in memory, including when the runs have to 
+    be merged in several passes.
+    """
+    expected_files = [str(tmp_path / ("expected_" + name)) for name in txt_args]
+    Indexer(["test_rel_wiki.xml"] + expected_files)
+    files = [str(tmp_path / name) for name in txt_args]
+    for fan_in in [spimi.MAX_FAN_IN, 2]:
+        monkeypatch.setattr(spimi, "MAX_FAN_IN", fan_in)
+        ind = Indexer(["--memory-budget=0.0001", "test_rel_wiki.xml"] + files)
+        assert ind.num_runs == ind.num_pages
+        assert len(ind.stem_runs) == len(ind.title_runs) == ind.num_pages
+
+        for read_file, path in [(read_title_file, 0), (read_docs_file, 1), 
+            (read_words_file, 2), (read_stems_file, "stems"), 
+            (read_words_file, "title")]:
+            expected = {}
+            actual = {}
+            if path in ["stems", "title"]:
+                read_file(companion_file(expected_files[2], path), expected)
+                read_file(companion_file(files[2], path), actual)
+            else:
+                read_file(expected_files[path], expected)
+                read_file(files[path], actual)
+            assert actual == expected
+
+    ind = Indexer(["--memory-budget=64", "test_rel_wiki.xml"] + files)
+    assert ind.num_runs == 1 and ind.stem_runs == ind.title_runs == []
+    with pytest.raises(ArgumentError):
+        Indexer(["--memory-budget=0", "test_rel_wiki.xml"] + files)
+
+def test_merge_fan_in(tmp_path, monkeypatch):
+    """
+    Tests that merging more runs than the fan-in gives the same postings as 
+    merging them all at once, while never having more than fan_in runs open.
+    """
+    runs = []
+    for run_num in range(10):
+        run = str(tmp_path / ("run" + str(run_num) + ".txt"))
+        spimi.write_run(run, {"apple": [run_num, 1], "pear": [run_num, 2],
+            "word" + str(run_num): [run_num, 3]})
+        runs.append(run)
+    expected = list(spimi.merge_postings(runs))
+    open_runs = [0, 0]  # runs open now, most runs open at once
+    real_read_run = spimi.read_run
+    def read_run(run):
+        open_runs[0] += 1
+        open_runs[1] = max(open_runs)
+        try:
+            yield from real_read_run(run)
+        finally:
+            open_runs[0] -= 1
+    monkeypatch.setattr(spimi, "read_run", read_run)
+    assert list(spimi.merge_runs(runs, fan_in=3)) == expected
+    assert open_runs == [0, 3]
+    assert expected[0] == ("apple", [(n, 1) for n in range(10)])
+
+def test_compressed_corpus(tmp_path):
+    """
+    Tests that the indexer reads .xml.bz2 and .xml.gz dumps directly, both when
+    parsing the whole corpus and when streaming it under a memory budget, and
+    writes the same index as for the uncompressed XML.
+    """
+    expected_files = [str(tmp_path / ("expected_" + name)) for name in txt_args]
+    Indexer(["test_rel_wiki.xml"] + expected_files)
+    expected = {}
+    read_words_file(expected_files[2], expected)
+
+    with open("test_rel_wiki.xml", "rb") as xml_fh:
+        xml = xml_fh.read()
+    for ext, module in [(".xml.bz2", bz2), (".xml.gz", gzip)]:
+        dump = str(tmp_path / ("test_rel_wiki" + ext))
+        with module.open(dump, "wb") as dump_fh:
+            dump_fh.write(xml)
+        for options in [[], ["--memory-budget=0.0001"]]:
+            files = [str(tmp_path / name) for name in txt_args]
+            Indexer(options + [dump] + files)
+            actual = {}
+            read_words_file(files[2], actual)
+            assert actual == expected
+
+    # chunks much smaller than the file, with a queue that fills up
+    reader = decompress.PipelinedReader(bz2.open(dump[:-3] + ".bz2", "rb"), 
+        chunk_size=16, max_chunks=2)
+    assert reader.read() == xml
+    reader.close()
+    reader = decompress.PipelinedReader(gzip.open(dump, "rb"), chunk_size=16, 
+        max_chunks=2)
+    assert reader.read(10) == xml[:10]
+    reader.close()  # closing before the end stops the background thread
+    assert not reader.thread.is_alive()
+
+def test_snippets(tmp_path):
+    """
+    Tests that every page's text can be read back out of a document store with
+    many small blocks, and that the querier's snippets highlight search words 
+    while reading only the blocks that hold its results.
+    """
+    files = [str(tmp_path / name) for name in txt_args]
+    Indexer(["test_wiki_11.xml"] + files)
+    store_files = [companion_file(files[0], "store", ".bin"), 
+        companion_file(files[0], "store")]
+    with pytest.raises(FileNotFoundError):  # keeps the existing index's store
+        Indexer(["nope.xml"] + files)
+    assert DocStore(store_files[0], store_files[1]).text(1) is not None
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+    writer = DocStoreWriter(store_files[0], store_files[1], block_size=40)
+    pages = {}
+    for page in et.parse("test_wiki_11.xml").getroot().findall("page"):
+        pages[int(page.find('id').text)] = page.find('text').text
+        writer.add(int(page.find('id').text), page.find('text').text)
+    writer.close()
+
+    store = DocStore(store_files[0], store_files[1], cache_blocks=2)
+    assert len(store.blocks) > 2
+    for pid, text in pages.items():
+        assert store.text(pid) == text
+    assert store.text(12345) is None
+
+    querier = Query(files)
+    words = querier.processed_terms("juice")
+    assert querier.snippet(querier.top_scores(words)[0][0], words) == \
+        "Many people build orange **juice**."
+    words = querier.processed_terms("tall oranges")
+    snippet = querier.snippet(3, words)
+    assert "**oranges**" in snippet and "**orange.**" not in snippet
+    assert "[[" not in snippet
+    assert querier.doc_store.read_block.cache_info().currsize <= 2
+
+    # link text never runs into the text after the link, so every word is 
+    # matched through the indexer's stems and nltk's stemmer isn't needed
+    writer = DocStoreWriter(store_files[0], store_files[1])
+    writer.add(1, "Fans of [[Twister|tornado]]es drink [[orange]]'s juice.")
+    writer.close()
+    querier = Query(files)
+    words = querier.processed_terms("orange juice")
+    assert querier.snippet(1, words) == \
+        "Fans of tornadoes drink **orange**'s **juice**."
+    assert querier.stemmer is None
+
+def test_pagerank_postings(tmp_path):
+    """
+    Tests that the precomputed relevance * PageRank postings give --pagerank 
+    queries exactly the same scores as multiplying at query time, that a 
+    PageRank weight of 0 reduces them to plain term relevance, and that they 
+    are never used once the PageRank scores have changed: reindexing without
+    them deletes them, and rank.py recomputes them.
+    """
+    expected_files = [str(tmp_path / ("expected_" + name)) for name in txt_args]
+    files = [str(tmp_path / name) for name in txt_args]
+    Indexer(["test_pr_wiki.xml"] + expected_files)
+    Indexer(["--pagerank-postings", "test_pr_wiki.xml"] + files)
+    for flag, static in [(["--pagerank"], True), ([], False)]:
+        expected = Query(flag + expected_files)
+        actual = Query(flag + files)
+        assert actual.static_scores == static
+        for terms in ["tall", "new york skyscrapers", "cart"]:
+            words = expected.processed_terms(terms)
+            assert actual.top_scores(words) == expected.top_scores(words)
+
+    Indexer(["--pagerank-weight=0", "test_pr_wiki.xml"] + files)
+    querier = Query(["--pagerank"] + files)
+    words = querier.processed_terms("tall")
+    assert querier.top_scores(words) == Query(expected_files).top_scores(words)
+
+    def assert_current(query_files, static):
+        expected = Query(["--pagerank"] + expected_files)
+        actual = Query(["--pagerank"] + query_files)
+        assert actual.static_scores == static
+        for terms in ["tall", "new york skyscrapers", "cart"]:
+            words = expected.processed_terms(terms)
+            assert sorted(actual.top_scores(words, k=100)) == \
+                pytest.approx(sorted(expected.top_scores(words, k=100)))
+
+    Indexer(["--damping=0.9", "test_pr_wiki.xml"] + expected_files)
+    Indexer(["--pagerank-postings", "test_pr_wiki.xml"] + files)
+    Indexer(["--damping=0.9", "test_pr_wiki.xml"] + files)
+    for path in [files[2], companion_file(files[2], "title")]:
+        assert not os.path.exists(companion_file(path, "pagerank"))
+    assert_current(files, False)
+
+    Indexer(["--pagerank-postings", "test_pr_wiki.xml"] + files)
+    Ranker(["--damping=0.9", files[1]])
+    assert_current(files, True)
+    # postings computed from other PageRank scores than the docs file's
+    ids_to_pageranks = {}
+    read_docs_file(files[1], ids_to_pageranks)
+    ids_to_pageranks[min(ids_to_pageranks)] /= 2
+    write_docs_file(files[1], ids_to_pageranks)
+    assert not Query(["--pagerank"] + files).static_scores
+
+    shard_files = [str(tmp_path / ("shard_" + name)) for name in txt_args]
+    Indexer(["--shards=2", "--reorder=pagerank", "--pagerank-postings", 
+        "test_pr_wiki.xml"] + shard_files)
+    Ranker(["--damping=0.9", shard_files[1]])
+    for shard in range(2):
+        assert Query(["--pagerank"] + [companion_file(f, str(shard)) 
+            for f in shard_files]).static_scores
+
+def test_vector_query(tmp_path):
+    """
+    Tests that the NumPy scoring backend returns the same top scores as the
+    dictionary-based querier, one search at a time and in batches, with and 
+    without PageRank.
+    """
+    files = [str(tmp_path / name) for name in txt_args]
+    Indexer(["test_wiki_11.xml"] + files)
+    searches = ["orange", "bUiLds", "blood orange", "new york skyscrapers", 
+        "cart", "", "orange orange juice"]
+    for flag in [[], ["--pagerank"]]:
+        querier = Query(flag + files)
+        vector_querier = VectorQuery(flag + files)
+        all_words = [querier.processed_terms(terms) for terms in searches]
+        batch_results = vector_querier.batch_top_scores(all_words, batch_size=3)
+        assert vector_querier.batch_top_scores([[], ["zzz"]]) == [[], []]
+        for words, batch_result in zip(all_words, batch_results):
+            expected = querier.top_scores(words)
+            actual = vector_querier.top_scores(words)
+            assert len(actual) == len(expected) == len(batch_result)
+            assert [s for _, s in actual] == \
+                pytest.approx([s for _, s in expected])
+            assert batch_result == pytest.approx(actual)
+            if len(set(s for _, s in expected)) == len(expected):  # no ties
+                assert [p for p, _ in actual] == [p for p, _ in expected]
+        assert vector_querier.retrieve_results(all_words[0]) == \
+            querier.retrieve_results(all_words[0])
+
+def test_reorder(tmp_path):
+    """
+    Tests that renumbering pages in PageRank or link order changes the ids in 
+    the postings but not the results, for the dictionary-based and NumPy 
+    queriers, and that reranking keeps the new numbering.
+    """
+    expected_files = [str(tmp_path / ("expected_" + name)) for name in txt_args]
+    Indexer(["test_pr_wiki.xml"] + expected_files)
+    files = [str(tmp_path / name) for name in txt_args]
+    with pytest.raises(ArgumentError):
+        Indexer(["--reorder=alphabetical", "test_pr_wiki.xml"] + files)
+    for ordering in ["pagerank", "links"]:
+        Indexer(["--reorder=" + ordering, "test_pr_wiki.xml"] + files)
+        ids_to_pageranks, ordinals_to_ids = {}, {}
+        read_docs_file(files[1], ids_to_pageranks, ordinals_to_ids)
+        assert sorted(ordinals_to_ids.keys()) == \
+            list(range(len(ids_to_pageranks)))
+        assert sorted(ordinals_to_ids.values()) == sorted(ids_to_pageranks)
+        if ordering == "pagerank":
+            ranks = [ids_to_pageranks[ordinals_to_ids[ordinal]] 
+                for ordinal in range(len(ordinals_to_ids))]
+            assert ranks == sorted(ranks, reverse=True)
+        Ranker([files[1]])
+        remapped = {}
+        read_docs_file(files[1], {}, remapped)
+        assert remapped == ordinals_to_ids
+
+        for flag in [[], ["--pagerank"]]:
+            expected = Query(flag + expected_files)
+            for querier in [Query(flag + files), VectorQuery(flag + files)]:
+                for terms in ["tall", "new york skyscrapers", "cart"]:
+                    words = expected.processed_terms(terms)
+                    assert sorted(querier.top_scores(words, k=100)) == \
+                        pytest.approx(sorted(expected.top_scores(words, k=100)))
+
+def test_dedup(tmp_path, monkeypatch):
+    """
+    Tests that near-duplicate pages are collapsed into the page that more pages
+    link to, merging their links and removing the duplicate from the title, 
+    words and links files, both in memory and when spilling runs to disk, and
+    that identical pages are compared a linear number of times.
+    """
+    words = "the orange is the fruit of a citrus tree".split()
+    assert minhash.similarity(minhash.signature(words), 
+        minhash.signature(words + ["lemon"])) > 0.5
+    assert minhash.similarity(minhash.signature(words), 
+        minhash.signature("a sour yellow lemon".split())) < 0.1
+    assert minhash.signature([]) is None
+    # B and C only share their first band, which unrelated A fills first
+    sig_b = tuple(range(64))
+    sig_c = tuple(n + 100 if n % 8 == 7 and n > 8 else n for n in range(64))
+    sig_a = sig_b[:8] + tuple(range(200, 256))
+    assert minhash.similarity(sig_b, sig_c) == 57/64
+    for signatures in [{2: sig_b, 3: sig_c}, {1: sig_a, 2: sig_b, 3: sig_c}]:
+        assert minhash.near_duplicates(signatures, 0.8) == [[2, 3]]
+    comparisons = []
+    similarity = minhash.similarity
+    monkeypatch.setattr(minhash, "similarity", 
+        lambda sig1, sig2: comparisons.append(1) or similarity(sig1, sig2))
+    stubs = {pid: sig_b for pid in range(2000)}
+    assert minhash.near_duplicates(stubs, 0.8) == [list(range(2000))]
+    assert len(comparisons) == 1999
+    monkeypatch.undo()
+
+    files = [str(tmp_path / name) for name in txt_args]
+    ind = Indexer(["test_dedup_wiki.xml"] + files)
+    assert ind.duplicates == {}
+    with pytest.raises(ArgumentError):
+        Indexer(["--dedup=1.5", "test_dedup_wiki.xml"] + files)
+
+    for options in [["--dedup=0.8"], ["--dedup=0.8", "--memory-budget=0.0001"]]:
+        ind = Indexer(options + ["test_dedup_wiki.xml"] + files)
+        assert ind.duplicates == {2: 1}
+        assert ind.links_shrinkage == (8, 6)
+        assert ind.postings_shrinkage[0] > ind.postings_shrinkage[1]
+        ids_to_titles = {}
+        read_title_file(files[0], ids_to_titles)
+        assert sorted(ids_to_titles.keys()) == [1, 3, 4, 5]
+        ids_to_links = {}
+        read_links_file(companion_file(files[1], "links"), ids_to_links)
+        assert ids_to_links == {1: {3, 4, 5}, 3: {1}, 4: {1}, 5: {1}}
+        words_to_relevance = {}
+        read_words_file(files[2], words_to_relevance)
+        assert all(2 not in ids for ids in words_to_relevance.values())
+        # idf counts the 4 pages left, of which 2 mention florida
+        assert words_to_relevance["florida"][3] == pytest.approx(math.log(4/2))
+        querier = Query(files)
+        words = querier.processed_terms("citrus")
+        assert sorted(pid for pid, _ in querier.top_scores(words)) == [1, 5]
+
+def test_title_field(tmp_path):
+    """
+    Tests that the title field's postings hold idf-weighted, length-normalized
+    title scores, that --title-only searches them alone, and that 
+    --title-boost adds them to the whole page's scores, for the dictionary-
+    based and NumPy queriers and across shards.
+    """
+    files = [str(tmp_path / name) for name in txt_args]
+    Indexer(["test_wiki_11.xml"] + files)
+    title_postings = {}
+    read_words_file(companion_file(files[2], "title"), title_postings)
+    # "Oranges" and "Blood Oranges" are the 2 of 11 titles with "orange"
+    assert title_postings["orang"] == pytest.approx(
+        {1: math.log(11/2), 3: math.log(11/2) / math.sqrt(2)})
+
+    with pytest.raises(ArgumentError):
+        Query(["--title-boost=-1"] + files)
+    for flag in [[], ["--pagerank"]]:
+        body = Query(flag + files)
+        titles = Query(flag + ["--title-only"] + files)
+        assert titles.words_to_relevance.keys() == title_postings.keys()
+        boosted = Query(flag + ["--title-boost=2"] + files)
+        for terms in ["orange", "new york", "blood orange", "cart"]:
+            words = body.processed_terms(terms)
+            expected = dict(body.top_scores(words, k=100))
+            for pid, score in titles.top_scores(words, k=100):
+                expected[pid] = expected.get(pid, 0) + 2 * score
+            assert dict(boosted.top_scores(words, k=100)) == \
+                pytest.approx(expected)
+        assert titles.retrieve_results(body.processed_terms("orange")) == \
+            ["Oranges", "Blood Oranges"]
+
+        for querier in [titles, boosted]:
+            vector_querier = VectorQuery(querier.option_args() + files)
+            for terms in ["orange", "new york", "blood orange"]:
+                words = body.processed_terms(terms)
+                assert sorted(vector_querier.top_scores(words, k=100)) == \
+                    pytest.approx(sorted(querier.top_scores(words, k=100)))
+
+    words = body.processed_terms("blood orange")
+    expected = Query(["--title-boost=2"] + files).top_scores(words)
+    Indexer(["--shards=3", "test_wiki_11.xml"] + files)
+    coordinator = Coordinator(["--title-boost=2"] + files)
+    try:
+        assert [s for _, s in coordinator.top_scores(words)] == \
+            pytest.approx([s for _, s in expected])
+    finally:
+        coordinator.close()
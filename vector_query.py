@@ -0,0 +1,227 @@
+import sys
+from ctypes import ArgumentError
+import numpy as np
+from query import Query
+from file_io import *
+
+def read_words_arrays(words: str, doc_keys, postings: dict):
+    """
+    reads the words file into NumPy arrays rather than nested dictionaries,
+    replacing the page ids (or the indexer's ordinals, for a reordered index)
+    with their positions in doc_keys
+    :param words: the file name that the words_to_doc_relevance dictionary was written to
+    :param doc_keys: sorted array of every page id (or indexer ordinal) in the words file
+    :param postings: the dictionary that words -> (ordinal array, score array) get written into
+    :return: n/a
+    """
+    with open(words, "r") as words_fh:
+        for line in words_fh:
+            split = line.split()
+            if len(split) < 3:
+                continue
+            ids = np.array(split[1::2], dtype=np.int64)
+            postings[split[0]] = (np.searchsorted(doc_keys, ids),
+                np.array(split[2::2], dtype=np.float64))
+
+class VectorQuery(Query):
+    """
+    Query that scores documents with NumPy instead of Python dictionaries.
+    Pages are numbered with dense ordinals, each word's postings are held as an
+    array of ordinals and an array of scores (with PageRank already multiplied
+    in for --pagerank), and a search adds each word's scores into a dense array
+    of document scores with a single vectorized scatter-add.  The top documents
+    are then found with a partial selection (argpartition) rather than a full
+    sort.  batch_top_scores scores many searches at once, as the product of a
+    sparse search-word matrix and the columns of the word-document matrix for
+    the pages that match at least one of the searches.
+    """
+    def __init__(self, args):
+        self.pagerank = False
+        self.t_file, self.d_file, self.w_file = self.process_arguments(args)
+        self.stop_words = None  # normalization settings are loaded lazily
+        self.doc_store = None  # and so is the document store
+
+        self.ids_to_titles = {}
+        read_title_file(self.t_file, self.ids_to_titles)
+
+        self.ids_to_pagerank = {}
+        self.remapped_ids = {}  # indexer ordinals to page IDs, if reordered
+        read_docs_file(self.d_file, self.ids_to_pagerank, self.remapped_ids)
+
+        # dense ordinals follow the indexer's ordinals if it assigned them
+        doc_keys = sorted(self.remapped_ids.keys() if self.remapped_ids 
+            else self.ids_to_titles.keys())
+        self.doc_keys = np.array(doc_keys, dtype=np.int64)
+        self.ordinals_to_ids = np.array([self.remapped_ids.get(key, key)
+            for key in doc_keys], dtype=np.int64)
+        self.num_pages = len(self.ordinals_to_ids)
+
+        # words to (ordinal array, score array), with the title field folded
+        # in and preferring precomputed relevance * PageRank postings with 
+        # --pagerank, like Query does
+        self.static_scores = False
+        title_file = companion_file(self.w_file, "title")
+        if self.title_only:
+            self.postings = self.load_postings(title_file)
+        else:
+            self.postings = self.load_postings(self.w_file)
+            if self.title_boost:
+                self.add_field(self.load_postings(title_file), self.title_boost)
+        if not self.static_scores:
+            if self.pagerank:  # multiplies PageRank in once, at load time
+                ranks = np.array([self.ids_to_pagerank[pid]
+                    for pid in self.ordinals_to_ids.tolist()], dtype=np.float64)
+                for ordinals, scores in self.postings.values():
+                    scores *= ranks[ordinals]
+
+    def load_postings(self, words_file: str) -> dict:
+        """Reads a words file (or a field's words file) into arrays, preferring
+        the copy that already factors PageRank in with --pagerank, in which 
+        case static_scores is set to True.
+
+        Parameters:
+        words_file -- filepath string of the words file
+
+        Returns:
+        A dict of words to (ordinal array, score array) tuples
+        """
+        postings = {}
+        if self.pagerank and self.has_static_postings(words_file):
+            read_words_arrays(companion_file(words_file, "pagerank"),
+                self.doc_keys, postings)
+            self.static_scores = True
+            return postings
+        read_words_arrays(words_file, self.doc_keys, postings)
+        return postings
+
+    def add_field(self, field_postings: dict, boost: float):
+        """Adds a field's scores, multiplied by the field's boost, into the 
+        score arrays of the postings, merging the two lists of ordinals.
+
+        Parameters:
+        field_postings -- dict of words to (ordinal array, score array) tuples
+        boost -- weight of the field's scores relative to the whole page's
+        """
+        for word, (field_ordinals, field_scores) in field_postings.items():
+            if word not in self.postings:
+                self.postings[word] = (field_ordinals, boost * field_scores)
+                continue
+            ordinals, scores = self.postings[word]
+            ordinals, inverse = np.unique(np.concatenate((ordinals, 
+                field_ordinals)), return_inverse=True)
+            self.postings[word] = (ordinals, np.bincount(inverse, 
+                weights=np.concatenate((scores, boost * field_scores)),
+                minlength=len(ordinals)))
+
+    def top_scores(self, words: list, k=10) -> list:
+        """Adds up the scores of the search words' postings into a dense array
+        of document scores and selects the top, maximum of k, documents.
+
+        Parameters:
+        words -- list of proccessed words from search query
+        k -- maximum number of documents to return
+
+        Returns:
+        A list of (page ID, score) tuples in descending order by score
+        """
+        doc_scores = np.zeros(self.num_pages)
+        matched = np.zeros(self.num_pages, dtype=bool)
+        for word in words:
+            if word in self.postings:
+                ordinals, scores = self.postings[word]
+                # ordinals are unique within a postings list, so a plain
+                # fancy-indexed add is a correct scatter-add
+                doc_scores[ordinals] += scores
+                matched[ordinals] = True
+        candidates = np.flatnonzero(matched)
+        return self.select_top(candidates, doc_scores[candidates], k)
+
+    def batch_top_scores(self, searches: list, k=10, batch_size=256) -> list:
+        """Scores many searches at once for offline evaluation.  For each
+        batch, the search-word matrix (searches by words, holding how many
+        times each search contains each word) is multiplied by the word-
+        document matrix one word at a time: the column of searches containing a
+        word times that word's row of postings is added into a score matrix.
+        The score matrix only has a column for each candidate page, one that 
+        some search in the batch matched, so its size follows the batch's 
+        postings rather than the number of pages in the index.
+
+        Parameters:
+        searches -- list of lists of proccessed words
+        k -- maximum number of documents to return per search
+        batch_size -- number of searches scored together
+
+        Returns:
+        A list holding, for each search, a list of (page ID, score) tuples in
+        descending order by score
+        """
+        results = []
+        for first in range(0, len(searches), batch_size):
+            batch = searches[first:first + batch_size]
+            words_to_rows = {}  # the sparse search-word matrix
+            for row, words in enumerate(batch):
+                for word in words:
+                    if word in self.postings:
+                        if word not in words_to_rows:
+                            words_to_rows[word] = {}
+                        words_to_rows[word][row] = \
+                            words_to_rows[word].get(row, 0) + 1
+
+            candidates = np.unique(np.concatenate([self.postings[word][0]
+                for word in words_to_rows] + [np.zeros(0, dtype=np.int64)]))
+            doc_scores = np.zeros((len(batch), len(candidates)))
+            matched = np.zeros((len(batch), len(candidates)), dtype=bool)
+            for word, rows_to_counts in words_to_rows.items():
+                ordinals, scores = self.postings[word]
+                rows = np.fromiter(rows_to_counts.keys(), dtype=np.int64)
+                counts = np.fromiter(rows_to_counts.values(), dtype=np.float64)
+                block = np.ix_(rows, np.searchsorted(candidates, ordinals))
+                doc_scores[block] += counts[:, None] * scores[None, :]
+                matched[block] = True
+
+            for row in range(len(batch)):
+                columns = np.flatnonzero(matched[row])
+                results.append(self.select_top(candidates[columns],
+                    doc_scores[row, columns], k))
+        return results
+
+    def select_top(self, candidates, scores, k: int) -> list:
+        """Selects the k highest scoring of the candidate documents using a
+        partial selection, then sorts only those k.
+
+        Parameters:
+        candidates -- array of ordinals of the documents that matched a search
+        scores -- array of the candidates' scores, in the same order
+        k -- maximum number of documents to return
+
+        Returns:
+        A list of (page ID, score) tuples in descending order by score
+        """
+        if k <= 0:
+            return []
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return list(zip(self.ordinals_to_ids[candidates[order]].tolist(),
+            scores[order].tolist()))
+
+if __name__ == "__main__":
+    """
+    Sets up the same REPL interface as query.py, scoring with NumPy.
+    """
+    try:
+        q = VectorQuery(sys.argv[1:])
+
+        while True is True:  # continue until break statement is reached
+            response = input("Search for pages here: ")
+            if response == ':quit':
+                break
+            q.print_results(response)
+    except FileNotFoundError:
+        print("File not found -- try again.")
+    except ArgumentError:
+        print("Invalid command line arguments, try again.  Arguments must take"
+        + " the form: \n    --pagerank <title-file>.txt <docs-file>.txt"
+        + " <words-file>.txt \nwhere --pagerank is an optional argument"
+        + " (as are --title-boost=<b> and --title-only).")